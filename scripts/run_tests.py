@@ -5,27 +5,41 @@
 """
 
 import argparse
+import asyncio
 import sys
 import os
 import subprocess
 import time
-import requests
+import httpx
 from typing import List, Dict
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
+# 测试文件目录
+TESTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests')
+
 class TestRunner:
     """测试运行器类"""
     
-    def __init__(self, base_url: str = "http://localhost:16009"):
+    __slots__ = ("base_url", "test_results", "pytest_args", "_client")
+    
+    def __init__(self, base_url: str = "http://localhost:16009", workers: str = None):
         self.base_url = base_url
         self.test_results = {}
+        # 使用pytest-xdist分发测试；按文件分组，同一模块的测试始终在同一个worker中运行
+        self.pytest_args = ["-q", "-n", workers, "--dist=loadfile"] if workers else ["-q"]
+        # 复用连接，避免健康检查轮询时每次都重新建立TCP连接
+        self._client = httpx.Client(
+            base_url=base_url,
+            timeout=5.0,
+            limits=httpx.Limits(max_connections=1, max_keepalive_connections=1)
+        )
     
     def check_service_health(self) -> bool:
         """检查沙盒服务是否健康"""
         try:
-            response = requests.get(f"{self.base_url}/health", timeout=5)
+            response = self._client.get("/health")
             if response.status_code == 200:
                 data = response.json()
                 return data.get("status") == "healthy"
@@ -34,176 +48,144 @@ class TestRunner:
             return False
     
     def wait_for_service(self, max_wait: int = 60) -> bool:
-        """等待服务启动"""
+        """等待服务启动，轮询间隔从50毫秒开始指数增长，最长1秒"""
         print(f"⏳ 等待沙盒服务启动 (最多等待{max_wait}秒)...")
         
-        for i in range(max_wait):
+        start = time.monotonic()
+        delay = 0.05
+        next_report = 10
+        
+        while True:
             if self.check_service_health():
                 print("✅ 沙盒服务已就绪")
                 return True
             
-            if i % 10 == 0 and i > 0:
-                print(f"   仍在等待... ({i}/{max_wait}秒)")
+            elapsed = time.monotonic() - start
+            if elapsed >= max_wait:
+                break
             
-            time.sleep(1)
+            if elapsed >= next_report:
+                print(f"   仍在等待... ({int(elapsed)}/{max_wait}秒)")
+                next_report += 10
+            
+            time.sleep(min(delay, max_wait - elapsed))
+            delay = min(delay * 2, 1.0)
         
         print("❌ 等待服务启动超时")
         return False
     
-    def run_unit_tests(self) -> bool:
-        """运行单元测试"""
-        print("\n🔬 运行单元测试...")
-        print("=" * 50)
-        
+    def _require_service(self, result_key: str, label: str) -> bool:
+        """检查依赖沙盒服务的测试能否运行，不能运行时记录跳过原因"""
+        if self.check_service_health():
+            return True
+        print(f"❌ 沙盒服务不可用，跳过{label}")
+        self.test_results[result_key] = {"success": False, "error": "service_unavailable"}
+        return False
+    
+    def _run_pytest(self, result_key: str, label: str, test_file: str) -> bool:
+        """在独立子进程中用pytest运行测试文件，输出直接打印到终端"""
+        # 同一进程内多次调用pytest.main时，已导入的测试模块、conftest和插件状态会残留到后续套件
         try:
-            result = subprocess.run(
-                [sys.executable, "test_unit.py"],
-                capture_output=True,
-                text=True,
-                timeout=300
-            )
+            return_code = subprocess.run(
+                [sys.executable, "-m", "pytest", *self.pytest_args, os.path.join(TESTS_DIR, test_file)]
+            ).returncode
             
-            print(result.stdout)
-            if result.stderr:
-                print("错误输出:")
-                print(result.stderr)
-            
-            success = result.returncode == 0
-            self.test_results["unit_tests"] = {
+            success = return_code == 0
+            self.test_results[result_key] = {
                 "success": success,
-                "return_code": result.returncode
+                "return_code": return_code
             }
             
             return success
             
-        except subprocess.TimeoutExpired:
-            print("❌ 单元测试超时")
-            self.test_results["unit_tests"] = {"success": False, "error": "timeout"}
-            return False
         except Exception as e:
-            print(f"❌ 运行单元测试时出错: {e}")
-            self.test_results["unit_tests"] = {"success": False, "error": str(e)}
+            print(f"❌ 运行{label}时出错: {e}")
+            self.test_results[result_key] = {"success": False, "error": str(e)}
             return False
     
-    def run_integration_tests(self) -> bool:
-        """运行集成测试"""
-        print("\n🧪 运行集成测试...")
-        print("=" * 50)
-        
-        if not self.check_service_health():
-            print("❌ 沙盒服务不可用，跳过集成测试")
-            self.test_results["integration_tests"] = {"success": False, "error": "service_unavailable"}
-            return False
-        
+    async def _run_pytest_subprocess(self, result_key: str, label: str, test_file: str) -> bool:
+        """在独立子进程中运行测试文件，结束后统一打印输出，避免并行时输出交错"""
         try:
-            result = subprocess.run(
-                [sys.executable, "test_comprehensive.py"],
-                capture_output=True,
-                text=True,
-                timeout=600
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "pytest", *self.pytest_args, os.path.join(TESTS_DIR, test_file),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT
             )
+            stdout, _ = await process.communicate()
             
-            print(result.stdout)
-            if result.stderr:
-                print("错误输出:")
-                print(result.stderr)
+            print(f"\n📄 {label}输出:")
+            print("=" * 50)
+            print(stdout.decode("utf-8", errors="replace"))
             
-            success = result.returncode == 0
-            self.test_results["integration_tests"] = {
+            success = process.returncode == 0
+            self.test_results[result_key] = {
                 "success": success,
-                "return_code": result.returncode
+                "return_code": process.returncode
             }
             
             return success
             
-        except subprocess.TimeoutExpired:
-            print("❌ 集成测试超时")
-            self.test_results["integration_tests"] = {"success": False, "error": "timeout"}
-            return False
         except Exception as e:
-            print(f"❌ 运行集成测试时出错: {e}")
-            self.test_results["integration_tests"] = {"success": False, "error": str(e)}
+            print(f"❌ 运行{label}时出错: {e}")
+            self.test_results[result_key] = {"success": False, "error": str(e)}
             return False
     
+    async def run_parallel_tests(self, run_unit: bool, run_simple: bool, run_integration: bool) -> bool:
+        """并行运行互不依赖的单元、简单和集成测试，总耗时取决于最慢的套件"""
+        print("\n⚡ 并行运行测试套件...")
+        print("=" * 50)
+        
+        suites = []
+        if run_unit:
+            suites.append(("unit_tests", "单元测试", "test_unit.py"))
+        if run_simple and self._require_service("simple_tests", "简单测试"):
+            suites.append(("simple_tests", "简单测试", "test_sandbox.py"))
+        if run_integration and self._require_service("integration_tests", "集成测试"):
+            suites.append(("integration_tests", "集成测试", "test_comprehensive.py"))
+        
+        results = await asyncio.gather(
+            *[self._run_pytest_subprocess(*suite) for suite in suites]
+        )
+        
+        # 因服务不可用而跳过的套件同样视为失败
+        return all(results) and len(suites) == sum([run_unit, run_simple, run_integration])
+    
+    def run_unit_tests(self) -> bool:
+        """运行单元测试"""
+        print("\n🔬 运行单元测试...")
+        print("=" * 50)
+        
+        return self._run_pytest("unit_tests", "单元测试", "test_unit.py")
+    
+    def run_integration_tests(self) -> bool:
+        """运行集成测试"""
+        print("\n🧪 运行集成测试...")
+        print("=" * 50)
+        
+        if not self._require_service("integration_tests", "集成测试"):
+            return False
+        
+        return self._run_pytest("integration_tests", "集成测试", "test_comprehensive.py")
+    
     def run_simple_tests(self) -> bool:
         """运行简单测试"""
         print("\n🚀 运行简单测试...")
         print("=" * 50)
         
-        if not self.check_service_health():
-            print("❌ 沙盒服务不可用，跳过简单测试")
-            self.test_results["simple_tests"] = {"success": False, "error": "service_unavailable"}
+        if not self._require_service("simple_tests", "简单测试"):
             return False
         
-        try:
-            result = subprocess.run(
-                [sys.executable, "test_sandbox.py"],
-                capture_output=True,
-                text=True,
-                timeout=300
-            )
-            
-            print(result.stdout)
-            if result.stderr:
-                print("错误输出:")
-                print(result.stderr)
-            
-            success = result.returncode == 0
-            self.test_results["simple_tests"] = {
-                "success": success,
-                "return_code": result.returncode
-            }
-            
-            return success
-            
-        except subprocess.TimeoutExpired:
-            print("❌ 简单测试超时")
-            self.test_results["simple_tests"] = {"success": False, "error": "timeout"}
-            return False
-        except Exception as e:
-            print(f"❌ 运行简单测试时出错: {e}")
-            self.test_results["simple_tests"] = {"success": False, "error": str(e)}
-            return False
+        return self._run_pytest("simple_tests", "简单测试", "test_sandbox.py")
     
     def run_benchmark_tests(self) -> bool:
         """运行性能基准测试"""
         print("\n🏁 运行性能基准测试...")
         print("=" * 50)
         
-        if not self.check_service_health():
-            print("❌ 沙盒服务不可用，跳过性能测试")
-            self.test_results["benchmark_tests"] = {"success": False, "error": "service_unavailable"}
+        if not self._require_service("benchmark_tests", "性能测试"):
             return False
         
-        try:
-            result = subprocess.run(
-                [sys.executable, "test_benchmark.py"],
-                capture_output=True,
-                text=True,
-                timeout=1200  # 20分钟超时
-            )
-            
-            print(result.stdout)
-            if result.stderr:
-                print("错误输出:")
-                print(result.stderr)
-            
-            success = result.returncode == 0
-            self.test_results["benchmark_tests"] = {
-                "success": success,
-                "return_code": result.returncode
-            }
-            
-            return success
-            
-        except subprocess.TimeoutExpired:
-            print("❌ 性能测试超时")
-            self.test_results["benchmark_tests"] = {"success": False, "error": "timeout"}
-            return False
-        except Exception as e:
-            print(f"❌ 运行性能测试时出错: {e}")
-            self.test_results["benchmark_tests"] = {"success": False, "error": str(e)}
-            return False
+        return self._run_pytest("benchmark_tests", "性能测试", "test_benchmark.py")
     
     def print_summary(self):
         """打印测试结果摘要"""
@@ -243,6 +225,8 @@ def main():
     parser.add_argument("--url", default="http://localhost:16009", help="沙盒服务URL")
     parser.add_argument("--wait", action="store_true", help="等待服务启动")
     parser.add_argument("--no-service-check", action="store_true", help="跳过服务健康检查")
+    parser.add_argument("--parallel", action="store_true", help="在子进程中并行运行单元、简单和集成测试")
+    parser.add_argument("--workers", help="每个测试套件使用的pytest-xdist worker数量，如auto或4")
     
     args = parser.parse_args()
     
@@ -250,7 +234,9 @@ def main():
     if not any([args.unit, args.integration, args.simple, args.benchmark]):
         args.all = True
     
-    runner = TestRunner(args.url)
+    # 测试模块和conftest从环境变量读取服务地址，pytest子进程会继承该变量
+    os.environ["SANDBOX_URL"] = args.url
+    runner = TestRunner(args.url, args.workers)
     
     print("🧪 沙盒系统测试运行器")
     print(f"服务URL: {args.url}")
@@ -273,18 +259,27 @@ def main():
     # 运行测试
     all_passed = True
     
-    if args.unit or args.all:
-        if not runner.run_unit_tests():
-            all_passed = False
-    
-    if args.simple or args.all:
-        if not runner.run_simple_tests():
-            all_passed = False
-    
-    if args.integration or args.all:
-        if not runner.run_integration_tests():
+    if args.parallel:
+        if not asyncio.run(runner.run_parallel_tests(
+            run_unit=args.unit or args.all,
+            run_simple=args.simple or args.all,
+            run_integration=args.integration or args.all
+        )):
             all_passed = False
+    else:
+        if args.unit or args.all:
+            if not runner.run_unit_tests():
+                all_passed = False
+        
+        if args.simple or args.all:
+            if not runner.run_simple_tests():
+                all_passed = False
+        
+        if args.integration or args.all:
+            if not runner.run_integration_tests():
+                all_passed = False
     
+    # 性能测试占用资源较多，始终单独运行，避免干扰其它套件和测量结果
     if args.benchmark or args.all:
         if not runner.run_benchmark_tests():
             all_passed = False
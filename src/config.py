@@ -5,6 +5,7 @@
 """
 
 import os
+import functools
 from typing import Optional
 
 class Config:
@@ -15,24 +16,59 @@ class Config:
     DOCKER_CLIENT_TIMEOUT: int = int(os.getenv("DOCKER_CLIENT_TIMEOUT", "60"))
     DOCKER_CLIENT_MAX_RETRIES: int = int(os.getenv("DOCKER_CLIENT_MAX_RETRIES", "3"))
     DOCKER_CLIENT_RETRY_DELAY: int = int(os.getenv("DOCKER_CLIENT_RETRY_DELAY", "2"))
+    DOCKER_HEALTH_CACHE_TTL: float = float(os.getenv("DOCKER_HEALTH_CACHE_TTL", "2"))
     
     # 执行器配置
     EXECUTOR_IMAGE_NAME: str = os.getenv("EXECUTOR_IMAGE_NAME", "sandbox-executor")
     EXECUTOR_DOCKERFILE_PATH: str = os.getenv("EXECUTOR_DOCKERFILE_PATH", "docker/Dockerfile.executor")
+    # 镜像应在部署时构建；仅在本地开发时开启启动时自动构建
+    EXECUTOR_IMAGE_AUTO_BUILD: bool = os.getenv("EXECUTOR_IMAGE_AUTO_BUILD", "false").lower() == "true"
     
     # 容器资源限制
     CONTAINER_MEMORY_LIMIT: str = os.getenv("CONTAINER_MEMORY_LIMIT", "128m")
     CONTAINER_CPU_QUOTA: int = int(os.getenv("CONTAINER_CPU_QUOTA", "50000"))
     CONTAINER_TIMEOUT: int = int(os.getenv("CONTAINER_TIMEOUT", "30"))
+    # 单次执行返回的输出上限（字节），超出部分截断
+    MAX_LOG_BYTES: int = int(os.getenv("MAX_LOG_BYTES", str(1024 * 1024)))
     CONTAINER_USER: str = os.getenv("CONTAINER_USER", "sandbox")
+    # 执行用户的uid/gid，需与docker/Dockerfile.executor中创建sandbox用户时指定的一致
+    CONTAINER_UID: int = int(os.getenv("CONTAINER_UID", "1000"))
+    
+    # 预热容器池大小，0表示每次请求创建新容器
+    CONTAINER_POOL_SIZE: int = int(os.getenv("CONTAINER_POOL_SIZE", "0"))
     
     # 安全配置
     NETWORK_DISABLED: bool = os.getenv("NETWORK_DISABLED", "true").lower() == "true"
     SECURITY_OPTS: list = ["no-new-privileges"]
     
+    # 引用文件下载配置
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "32"))
+    HTTP_KEEPALIVE_TIMEOUT: int = int(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+    HTTP_DNS_CACHE_TTL: int = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+    HTTP_CONNECT_TIMEOUT: int = int(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+    HTTP_READ_TIMEOUT: int = int(os.getenv("HTTP_READ_TIMEOUT", "60"))
+    DOWNLOAD_CONCURRENCY: int = int(os.getenv("DOWNLOAD_CONCURRENCY", "8"))
+    DOWNLOAD_CHUNK_SIZE: int = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(256 * 1024)))
+    # 引用文件缓存目录（如/var/cache/sandbox），留空则不缓存
+    REF_FILE_CACHE_DIR: str = os.getenv("REF_FILE_CACHE_DIR", "")
+    
+    # 工作目录配置
+    # 工作目录路径在Docker守护进程所在主机上同样可见（服务直接运行在宿主机上）时，
+    # 挂载即可把引用文件交给容器，无需再复制；主服务运行在容器中时保持false，此时不挂载工作目录
+    SANDBOX_WORK_DIR_SHARED: bool = os.getenv("SANDBOX_WORK_DIR_SHARED", "false").lower() == "true"
+    # 工作目录根路径，留空则使用系统临时目录；共享时默认位于tmpfs，挂载给容器的目录不占用磁盘
+    SANDBOX_WORK_ROOT: str = os.getenv(
+        "SANDBOX_WORK_ROOT", "/dev/shm/sandbox" if SANDBOX_WORK_DIR_SHARED else ""
+    )
+    SANDBOX_WORK_DIR_MAX_AGE: int = int(os.getenv("SANDBOX_WORK_DIR_MAX_AGE", "1800"))
+    SANDBOX_WORK_DIR_SWEEP_INTERVAL: int = int(os.getenv("SANDBOX_WORK_DIR_SWEEP_INTERVAL", "300"))
+    
     # API配置
     API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
     API_PORT: int = int(os.getenv("API_PORT", "16009"))
+    # 工作进程数，每个进程各自持有Docker客户端、HTTP会话和容器池
+    API_WORKERS: int = int(os.getenv("API_WORKERS", "1"))
     API_TITLE: str = os.getenv("API_TITLE", "Python Sandbox Executor")
     API_VERSION: str = os.getenv("API_VERSION", "1.0.0")
     
@@ -43,7 +79,10 @@ class Config:
     # 开发模式
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
     
+    # 以下配置字典在环境变量读取后不再变化，首次构建后缓存复用，调用方不应修改返回值
+    
     @classmethod
+    @functools.cache
     def get_docker_client_config(cls) -> dict:
         """获取Docker客户端配置"""
         return {
@@ -53,6 +92,7 @@ class Config:
         }
     
     @classmethod
+    @functools.cache
     def get_container_config(cls) -> dict:
         """获取容器配置"""
         return {
@@ -65,6 +105,7 @@ class Config:
         }
     
     @classmethod
+    @functools.cache
     def get_api_config(cls) -> dict:
         """获取API配置"""
         return {
@@ -1,20 +1,32 @@
 """沙盒API应用程序入口点"""
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import config
 from utils.logging_config import setup_logging
-from routers.sandbox_router import router as sandbox_router
+from routers.sandbox_router import router as sandbox_router, sandbox_service
 
 # 设置日志
 setup_logging()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时创建共享资源，关闭时释放"""
+    await sandbox_service.startup()
+    yield
+    await sandbox_service.shutdown()
+
+
 # 创建FastAPI应用
 app = FastAPI(
     title=config.API_TITLE,
     version=config.API_VERSION,
-    description="一个基于Docker的安全Python代码执行环境"
+    description="一个基于Docker的安全Python代码执行环境",
+    lifespan=lifespan
 )
 
 # 添加CORS中间件
@@ -32,9 +44,11 @@ app.include_router(sandbox_router)
 
 if __name__ == "__main__":
     import uvicorn
+    # 开发模式下自动重载（仅支持单进程），否则按配置启动多个工作进程
     uvicorn.run(
         "main:app",
-        host="0.0.0.0",
-        port=16009,
-        reload=True
+        host=config.API_HOST,
+        port=config.API_PORT,
+        reload=config.DEBUG,
+        workers=1 if config.DEBUG else config.API_WORKERS
     )
\ No newline at end of file
@@ -1,18 +1,26 @@
 """请求数据模型"""
 
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, ConfigDict, Field, HttpUrl
 from typing import List, Optional
 
+# 单次请求允许的引用文件数量上限
+MAX_REF_FILES = 32
+
 
 class RefFile(BaseModel):
     """引用文件模型"""
+    model_config = ConfigDict(frozen=True)
+    
     url: HttpUrl
     filename: Optional[str] = None  # 可选的文件名，如果不提供则从URL推断
 
 
 class ExecuteRequest(BaseModel):
     """代码执行请求模型"""
+    # 请求解析后只读；客户端会附带language等字段，因此不能禁止额外字段
+    model_config = ConfigDict(frozen=True)
+    
     code: str
     timeout: Optional[int] = 30
     work_dir: Optional[str] = "/data"  # 工作目录，默认为/data
-    ref_files: Optional[List[RefFile]] = None
\ No newline at end of file
+    ref_files: Optional[List[RefFile]] = Field(default=None, max_length=MAX_REF_FILES)
\ No newline at end of file
@@ -7,6 +7,7 @@ from fastapi.responses import JSONResponse
 from models.request_models import ExecuteRequest
 from models.response_models import ExecuteResponse
 from services.sandbox_service import SandboxService
+from utils.validators import validate_work_dir
 
 logger = logging.getLogger(__name__)
 
@@ -25,10 +26,11 @@ async def root():
     return {"message": "Sandbox API is running", "status": "healthy"}
 
 
-@router.get("/health")
+# 同时接受HEAD，探活方只关心状态码，无需接收响应体
+@router.api_route("/health", methods=["GET", "HEAD"])
 async def health_check():
     """健康检查端点"""
-    if sandbox_service.docker_service.is_available():
+    if await sandbox_service.docker_service.check_health():
         return {"status": "healthy", "docker": "available"}
     else:
         raise HTTPException(status_code=503, detail="Docker service unavailable")
@@ -47,11 +49,13 @@ async def execute_code(request: ExecuteRequest):
         if request.timeout and (request.timeout < 1 or request.timeout > 300):
             raise HTTPException(status_code=400, detail="超时时间必须在1-300秒之间")
         
+        work_dir = validate_work_dir(request.work_dir)
+        
         # 执行代码
         result = await sandbox_service.execute_code(
             code=request.code,
             timeout=request.timeout,
-            work_dir_str=request.work_dir,
+            work_dir_str=work_dir,
             ref_files=request.ref_files
         )
         
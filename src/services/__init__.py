@@ -1,11 +1,15 @@
 """服务层模块"""
 
+from .container_pool import ContainerPool
 from .docker_service import DockerService
+from .file_cache import FileCache
 from .file_service import FileService
 from .sandbox_service import SandboxService
 
 __all__ = [
+    "ContainerPool",
     "DockerService",
+    "FileCache",
     "FileService",
     "SandboxService"
 ]
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""预热容器池服务类"""
+
+import asyncio
+import atexit
+import logging
+import uuid
+from typing import Set
+
+import docker
+
+from services.docker_service import DockerService
+
+logger = logging.getLogger(__name__)
+
+# 归还容器前执行的重置脚本：结束用户残留进程，并清空执行用户可写的所有目录，
+# 包括代码目录与共享内存，避免上一次请求的文件泄露给下一次请求；有文件删不掉时返回非零，容器随之被丢弃
+_RESET_SCRIPT = (
+    "kill -9 -1 2>/dev/null; "
+    "for d in /data /sandbox /tmp /var/tmp /dev/shm; do "
+    "rm -rf \"$d\"/* \"$d\"/.[!.]* \"$d\"/..?* || exit 1; "
+    "done"
+)
+
+
+class ContainerPool:
+    """预热执行容器池
+
+    容器以 `tail -f /dev/null` 常驻，请求通过 exec_run 在其中执行代码，
+    用完后重置并放回池中，避免每次请求创建和销毁容器的开销。
+    """
+
+    def __init__(self, docker_service: DockerService, size: int):
+        self.docker_service = docker_service
+        self.size = size
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._containers: Set = set()
+
+    async def start(self) -> None:
+        """预先创建并启动池中的所有容器"""
+        results = await asyncio.gather(
+            *[asyncio.to_thread(self._create_container) for _ in range(self.size)],
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"预热容器创建失败: {result}")
+            else:
+                self._queue.put_nowait(result)
+        logger.info(f"容器池已就绪: {self._queue.qsize()}/{self.size} 个容器")
+        # 进程未经正常关闭流程退出时，兜底清理残留的常驻容器
+        atexit.register(self._remove_all)
+
+    async def shutdown(self) -> None:
+        """销毁池中的所有容器"""
+        atexit.unregister(self._remove_all)
+        containers = list(self._containers)
+        await asyncio.gather(
+            *[asyncio.to_thread(self._remove_container, c) for c in containers]
+        )
+        logger.info(f"容器池已关闭，清理 {len(containers)} 个容器")
+
+    def try_acquire(self):
+        """取出一个空闲容器，池中暂无空闲容器时返回None"""
+        try:
+            return self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+    async def release(self, container, healthy: bool = True) -> None:
+        """重置容器并放回池中；容器异常时销毁并补充新容器"""
+        if healthy:
+            try:
+                exit_code, _ = await asyncio.to_thread(
+                    container.exec_run, ["sh", "-c", _RESET_SCRIPT]
+                )
+                healthy = exit_code == 0
+            except Exception as e:
+                logger.warning(f"重置容器失败 {container.name}: {e}")
+                healthy = False
+
+        if healthy:
+            self._queue.put_nowait(container)
+            return
+
+        await asyncio.to_thread(self._remove_container, container)
+        try:
+            replacement = await asyncio.to_thread(self._create_container)
+            self._queue.put_nowait(replacement)
+        except Exception as e:
+            logger.error(f"补充预热容器失败: {e}")
+
+    def _create_container(self):
+        """创建一个常驻的执行容器"""
+        container = self.docker_service.get_client().containers.run(
+            image=self.docker_service.image_name,
+            command=["tail", "-f", "/dev/null"],
+            name=f"sandbox-pool-{uuid.uuid4().hex[:8]}",
+            detach=True,
+            **self.docker_service.get_run_kwargs()
+        )
+        self._containers.add(container)
+        logger.info(f"预热容器 {container.name} 已启动")
+        return container
+
+    def _remove_container(self, container) -> None:
+        """强制删除容器"""
+        self._containers.discard(container)
+        try:
+            container.remove(force=True)
+            logger.info(f"预热容器 {container.name} 已清理")
+        except docker.errors.NotFound:
+            pass  # 容器已经不存在
+        except Exception as e:
+            logger.warning(f"清理预热容器失败: {e}")
+
+    def _remove_all(self) -> None:
+        """同步删除所有仍存活的容器"""
+        for container in list(self._containers):
+            self._remove_container(container)
@@ -1,9 +1,10 @@
 """Docker服务类"""
 
+import asyncio
 import docker
 import logging
 import time
-from typing import Optional
+from typing import List, Optional
 from config import config
 
 logger = logging.getLogger(__name__)
@@ -17,6 +18,11 @@ class DockerService:
         self.image_name = config.EXECUTOR_IMAGE_NAME
         self.dockerfile_path = config.EXECUTOR_DOCKERFILE_PATH
         self.container_config = config.get_container_config()
+        # 健康检查的ping结果缓存，避免频繁探测时每次都访问Docker守护进程
+        self._last_ping_ts = float("-inf")
+        self._last_ping_ok = False
+        # 资源限制与安全参数对所有执行容器相同，HostConfig首次创建容器时构建后复用
+        self._base_host_config: Optional[dict] = None
         
         self._initialize_client()
         if self.client:
@@ -57,6 +63,11 @@ class DockerService:
             self.client.images.get(self.image_name)
             logger.info(f"执行器镜像 {self.image_name} 已存在")
         except docker.errors.ImageNotFound:
+            if not config.EXECUTOR_IMAGE_AUTO_BUILD:
+                raise RuntimeError(
+                    f"执行器镜像 {self.image_name} 不存在，请先执行 "
+                    f"docker build -f {self.dockerfile_path} -t {self.image_name} ."
+                )
             logger.info(f"构建执行器镜像 {self.image_name}...")
             try:
                 # Build the image from Dockerfile.executor
@@ -78,6 +89,58 @@ class DockerService:
         """检查Docker服务是否可用"""
         return self.client is not None
     
+    async def check_health(self) -> bool:
+        """ping Docker守护进程确认其仍可访问，结果在短时间内缓存复用"""
+        if not self.client:
+            return False
+        
+        if time.monotonic() - self._last_ping_ts >= config.DOCKER_HEALTH_CACHE_TTL:
+            self._last_ping_ok = await asyncio.to_thread(self._ping)
+            self._last_ping_ts = time.monotonic()
+        return self._last_ping_ok
+    
+    def _ping(self) -> bool:
+        try:
+            return self.client.ping()
+        except Exception as e:
+            logger.warning(f"Docker守护进程ping失败: {e}")
+            return False
+    
+    def get_run_kwargs(self) -> dict:
+        """获取创建执行容器时通用的资源限制与安全参数"""
+        return {
+            'mem_limit': self.container_config['mem_limit'],
+            'cpu_quota': self.container_config['cpu_quota'],
+            'network_disabled': self.container_config['network_disabled'],
+            'security_opt': self.container_config['security_opt'],
+            'user': self.container_config['user'],
+        }
+    
+    def create_container(self, command: List[str], name: str, working_dir: str, binds: dict):
+        """通过底层API创建执行容器（不启动）
+
+        高层接口 containers.create 在创建后会额外inspect一次以构造模型对象，
+        这里直接用创建结果构造模型，后续调用只依赖容器ID。
+        """
+        api = self.get_client().api
+        if self._base_host_config is None:
+            self._base_host_config = api.create_host_config(
+                mem_limit=self.container_config['mem_limit'],
+                cpu_quota=self.container_config['cpu_quota'],
+                security_opt=self.container_config['security_opt'],
+            )
+        host_config = {**self._base_host_config, 'Binds': docker.utils.convert_volume_binds(binds)}
+        response = api.create_container(
+            self.image_name,
+            command=command,
+            name=name,
+            user=self.container_config['user'],
+            working_dir=working_dir,
+            network_disabled=self.container_config['network_disabled'],
+            host_config=host_config,
+        )
+        return self.client.containers.prepare_model({'Id': response['Id'], 'Name': name})
+    
     def get_client(self) -> docker.DockerClient:
         """获取Docker客户端"""
         if not self.client:
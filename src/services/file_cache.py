@@ -0,0 +1,85 @@
+"""引用文件磁盘缓存"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class FileCache:
+    """按URL缓存已下载的引用文件
+
+    每个URL对应 `{sha256}.bin` 和 `{sha256}.meta.json` 两个文件，
+    元数据中记录ETag和Last-Modified，用于下次下载时发起条件请求。
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.bin", self.cache_dir / f"{key}.meta.json"
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """返回重新验证缓存所需的条件请求头，没有可用缓存时返回空字典"""
+        data_path, meta_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return {}
+        if not data_path.exists():
+            return {}
+
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def copy_to(self, url: str, target_path: Path) -> None:
+        """将缓存内容复制到目标路径"""
+        data_path, _ = self._paths(url)
+        # 复制而非硬链接：目标文件会被沙盒代码读写，不能与缓存共享同一份数据
+        shutil.copyfile(data_path, target_path)
+
+    def store(
+        self,
+        url: str,
+        source_path: Path,
+        etag: Optional[str],
+        last_modified: Optional[str]
+    ) -> None:
+        """将下载完成的文件写入缓存，没有校验信息的响应不缓存"""
+        if not etag and not last_modified:
+            return
+
+        data_path, meta_path = self._paths(url)
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "size": os.path.getsize(source_path),
+        }
+        # 先写入临时文件再原子替换，并发请求同一URL时不会读到半个文件
+        self._replace(data_path, lambda tmp_path: shutil.copyfile(source_path, tmp_path))
+        self._replace(meta_path, lambda tmp_path: Path(tmp_path).write_text(json.dumps(meta)))
+        logger.info(f"引用文件已缓存: {url}")
+
+    def _replace(self, path: Path, write) -> None:
+        """通过临时文件写入并原子替换目标文件"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -1,15 +1,22 @@
 """文件服务类"""
 
 import os
+import time
+import shutil
+import posixpath
 import uuid
+import asyncio
 import logging
+import tempfile
 import aiohttp
-import aiofiles
-from pathlib import Path
-from typing import List
+from contextlib import suppress
+from pathlib import Path, PurePosixPath
+from typing import List, Optional, Set
 from fastapi import HTTPException
 
 from models.request_models import RefFile
+from services.file_cache import FileCache
+from config import config
 
 logger = logging.getLogger(__name__)
 
@@ -17,65 +24,227 @@ logger = logging.getLogger(__name__)
 class FileService:
     """文件服务管理类"""
     
-    @staticmethod
-    async def download_ref_files(ref_files: List[RefFile], work_dir: Path) -> List[str]:
-        """下载引用文件到工作目录"""
-        downloaded_files = []
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._work_root: Optional[str] = None
+        self._sweeper: Optional[asyncio.Task] = None
+        self._cleanup_tasks: Set[asyncio.Task] = set()
+        self._cache: Optional[FileCache] = None
+    
+    async def startup(self) -> None:
+        """创建应用级共享的HTTP会话，准备工作目录根路径和引用文件缓存，并启动过期目录清理任务"""
+        self._get_session()
+        self._work_root = self._prepare_work_root()
+        self._cache = self._prepare_cache()
+        if self._work_root:
+            self._sweeper = asyncio.create_task(self._sweep_work_root())
+    
+    async def shutdown(self) -> None:
+        """停止后台清理任务并关闭共享的HTTP会话"""
+        if self._sweeper:
+            self._sweeper.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._sweeper
+            self._sweeper = None
+        
+        if self._cleanup_tasks:
+            await asyncio.gather(*self._cleanup_tasks, return_exceptions=True)
         
+        if self._session and not self._session.closed:
+            await self._session.close()
+            logger.info("HTTP会话已关闭")
+        self._session = None
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的HTTP会话，未创建时惰性初始化"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=config.HTTP_MAX_CONNECTIONS,
+                limit_per_host=config.HTTP_MAX_CONNECTIONS_PER_HOST,
+                keepalive_timeout=config.HTTP_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=config.HTTP_DNS_CACHE_TTL
+            )
+            # 不限制总时长，避免大文件下载被整体超时打断；只限制建连和单次读取的等待时间
+            timeout = aiohttp.ClientTimeout(
+                total=None,
+                connect=config.HTTP_CONNECT_TIMEOUT,
+                sock_read=config.HTTP_READ_TIMEOUT
+            )
+            # 读缓冲区与下载分块大小一致，否则默认64KiB的缓冲区会让分块达不到设定大小
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                read_bufsize=config.DOWNLOAD_CHUNK_SIZE
+            )
+            logger.info("HTTP会话已创建")
+        return self._session
+    
+    @staticmethod
+    def _prepare_work_root() -> Optional[str]:
+        """创建工作目录根路径（默认位于tmpfs），不可用时退回系统临时目录"""
+        root = config.SANDBOX_WORK_ROOT
+        if not root:
+            return None
+        try:
+            os.makedirs(root, exist_ok=True)
+            logger.info(f"工作目录根路径: {root}")
+            return root
+        except OSError as e:
+            logger.warning(f"无法创建工作目录根路径 {root}，使用系统临时目录: {e}")
+            return None
+    
+    @staticmethod
+    def _prepare_cache() -> Optional[FileCache]:
+        """创建引用文件缓存，未配置或目录不可用时不启用缓存"""
+        cache_dir = config.REF_FILE_CACHE_DIR
+        if not cache_dir:
+            return None
+        try:
+            cache = FileCache(cache_dir)
+            logger.info(f"引用文件缓存目录: {cache_dir}")
+            return cache
+        except OSError as e:
+            logger.warning(f"无法创建引用文件缓存目录 {cache_dir}，不启用缓存: {e}")
+            return None
+    
+    def create_work_dir(self, prefix: str) -> Path:
+        """为本次请求创建工作目录"""
+        return Path(tempfile.mkdtemp(prefix=prefix, dir=self._work_root))
+    
+    def schedule_cleanup(self, directory: Path) -> None:
+        """在后台线程中删除目录，不阻塞响应返回"""
+        task = asyncio.create_task(asyncio.to_thread(self.cleanup_directory, directory))
+        self._cleanup_tasks.add(task)
+        task.add_done_callback(self._cleanup_tasks.discard)
+    
+    async def _sweep_work_root(self) -> None:
+        """定期清理因进程异常而遗留的过期工作目录"""
+        while True:
+            await asyncio.sleep(config.SANDBOX_WORK_DIR_SWEEP_INTERVAL)
+            try:
+                await asyncio.to_thread(self._remove_stale_dirs)
+            except Exception as e:
+                logger.warning(f"清理过期工作目录失败: {e}")
+    
+    def _remove_stale_dirs(self) -> None:
+        """删除工作目录根路径下超过最大存活时间的请求目录"""
+        cutoff = time.time() - config.SANDBOX_WORK_DIR_MAX_AGE
+        with os.scandir(self._work_root) as entries:
+            for entry in entries:
+                if (
+                    entry.name.startswith("sandbox_")
+                    and entry.is_dir(follow_symlinks=False)
+                    and entry.stat(follow_symlinks=False).st_mtime < cutoff
+                ):
+                    self.cleanup_directory(Path(entry.path))
+    
+    async def download_ref_files(self, ref_files: List[RefFile], work_dir: Path) -> List[str]:
+        """并发下载引用文件到工作目录，任一文件失败时取消其余下载"""
         if not ref_files:
-            return downloaded_files
+            return []
             
         logger.info(f"开始下载 {len(ref_files)} 个引用文件")
         
-        async with aiohttp.ClientSession() as session:
-            for ref_file in ref_files:
-                try:
-                    # 确定文件名
-                    if ref_file.filename:
-                        filename = ref_file.filename
-                    else:
-                        # 从URL推断文件名
-                        filename = Path(str(ref_file.url)).name or f"file_{uuid.uuid4().hex[:8]}"
-                    
-                    # 创建目标路径
-                    target_path = work_dir / filename
-                    target_path.parent.mkdir(parents=True, exist_ok=True)
-                    
-                    # 下载文件
-                    async with session.get(str(ref_file.url)) as response:
-                        if response.status == 200:
-                            async with aiofiles.open(target_path, 'wb') as f:
-                                async for chunk in response.content.iter_chunked(8192):
-                                    await f.write(chunk)
-                            
-                            # 设置文件权限，确保容器内的sandbox用户可以访问
-                            os.chmod(target_path, 0o666)
-                            
-                            downloaded_files.append(str(target_path))
-                            logger.info(f"文件下载成功: {ref_file.url} -> {target_path}")
-                        else:
-                            logger.error(f"文件下载失败: {ref_file.url}, 状态码: {response.status}")
-                            raise HTTPException(
-                                status_code=400, 
-                                detail=f"Failed to download file from {ref_file.url}"
-                            )
-                            
-                except Exception as e:
-                    logger.error(f"下载文件时发生错误: {ref_file.url}, 错误: {e}")
-                    raise HTTPException(
-                        status_code=400, 
-                        detail=f"Error downloading file: {str(e)}"
-                    )
+        # 在发起任何下载前校验文件名，避免路径穿越和同名文件相互覆盖
+        filenames = [self._resolve_filename(ref_file) for ref_file in ref_files]
+        for filename in filenames:
+            parts = PurePosixPath(filename).parts
+            if not parts or filename.startswith("/") or ".." in parts or "\\" in filename:
+                raise HTTPException(status_code=400, detail=f"Invalid ref file name: {filename!r}")
+        if len(set(filenames)) != len(filenames):
+            raise HTTPException(status_code=400, detail="Duplicate ref file names")
+        
+        session = self._get_session()
+        semaphore = asyncio.Semaphore(config.DOWNLOAD_CONCURRENCY)
+        
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tasks = [
+                    tg.create_task(self._download_one(session, ref_file, work_dir / filename, semaphore))
+                    for ref_file, filename in zip(ref_files, filenames)
+                ]
+        except ExceptionGroup as eg:
+            # 每个下载任务都会把错误包装为HTTPException，取第一个返回给调用方
+            raise eg.exceptions[0]
         
-        return downloaded_files
+        return [task.result() for task in tasks]
+    
+    @staticmethod
+    def _resolve_filename(ref_file: RefFile) -> str:
+        """确定引用文件的本地文件名，未指定时从URL路径推断"""
+        if ref_file.filename:
+            return posixpath.normpath(ref_file.filename)
+        return posixpath.basename(ref_file.url.path or "") or f"file_{uuid.uuid4().hex[:8]}"
+    
+    async def _download_one(
+        self,
+        session: aiohttp.ClientSession,
+        ref_file: RefFile,
+        target_path: Path,
+        semaphore: asyncio.Semaphore
+    ) -> str:
+        """下载单个引用文件，返回本地文件路径"""
+        async with semaphore:
+            try:
+                target_path.parent.mkdir(parents=True, exist_ok=True)
+                url = str(ref_file.url)
+                
+                # 有缓存时发起条件请求，内容未变化则直接使用缓存
+                headers = (
+                    await asyncio.to_thread(self._cache.conditional_headers, url)
+                    if self._cache else None
+                )
+                
+                # 下载文件
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304 and headers:
+                        await asyncio.to_thread(self._cache.copy_to, url, target_path)
+                        os.chmod(target_path, 0o666)
+                        
+                        logger.info(f"引用文件未变化，使用缓存: {ref_file.url} -> {target_path}")
+                        return str(target_path)
+                    elif response.status == 200:
+                        # 工作目录位于本地tmpfs，写入小块数据几乎不会阻塞，直接同步写入，
+                        # 避免每个分块都切换到线程池
+                        with open(target_path, 'wb') as f:
+                            async for chunk in response.content.iter_chunked(config.DOWNLOAD_CHUNK_SIZE):
+                                f.write(chunk)
+                        
+                        # 设置文件权限，确保容器内的sandbox用户可以访问
+                        os.chmod(target_path, 0o666)
+                        
+                        if self._cache:
+                            # 缓存只是加速手段，写入失败（如磁盘已满）不影响已经成功的下载
+                            try:
+                                await asyncio.to_thread(
+                                    self._cache.store,
+                                    url,
+                                    target_path,
+                                    response.headers.get("ETag"),
+                                    response.headers.get("Last-Modified")
+                                )
+                            except Exception as e:
+                                logger.warning(f"写入引用文件缓存失败: {url}, 错误: {e}")
+                        
+                        logger.info(f"文件下载成功: {ref_file.url} -> {target_path}")
+                        return str(target_path)
+                    else:
+                        logger.error(f"文件下载失败: {ref_file.url}, 状态码: {response.status}")
+                        raise HTTPException(
+                            status_code=400, 
+                            detail=f"Failed to download file from {ref_file.url}"
+                        )
+                        
+            except Exception as e:
+                logger.error(f"下载文件时发生错误: {ref_file.url}, 错误: {e}")
+                raise HTTPException(
+                    status_code=400, 
+                    detail=f"Error downloading file: {str(e)}"
+                )
     
     @staticmethod
     def cleanup_directory(directory: Path) -> None:
         """清理目录"""
-        try:
-            if directory.exists():
-                import shutil
-                shutil.rmtree(directory)
-                logger.info(f"工作目录 {directory} 已清理")
-        except Exception as e:
-            logger.warning(f"清理目录失败 {directory}: {e}")
\ No newline at end of file
+        # 删除失败的条目直接跳过，残留的目录会由过期目录清理任务再次处理
+        shutil.rmtree(directory, ignore_errors=True)
+        logger.info(f"工作目录 {directory} 已清理")
\ No newline at end of file
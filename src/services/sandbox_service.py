@@ -1,26 +1,108 @@
 """沙盒服务类"""
 
 import os
+import asyncio
 import uuid
-import tempfile
 import logging
 import tarfile
+import tempfile
 import io
+import posixpath
 import base64
-from pathlib import Path
-from typing import Dict, Any, List, Optional
+import time
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Coroutine, Iterable, List, Optional, Set, Tuple
 
 import docker
+import requests
 from fastapi import HTTPException
 
 from models.request_models import RefFile
 from models.response_models import ExecuteResponse, ImageFile
+from services.container_pool import ContainerPool
 from services.docker_service import DockerService
 from services.file_service import FileService
 from config import config
 
 logger = logging.getLogger(__name__)
 
+# 从工作目录中提取的图片格式（小写扩展名，不含点）
+_IMAGE_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'bmp', 'svg'})
+
+# 用户代码以文件形式放入容器，不受单个命令行参数128KiB的长度限制，也不必写进创建容器的请求；
+# 仍以 -c 引导执行，sys.path、sys.argv 和异常回溯中的文件名都与 python -c 一致
+_CODE_DIR = "/tmp"
+_CODE_FILENAME = "sandbox_code.py"
+_RUN_CODE_COMMAND = [
+    "python", "-c",
+    f"exec(compile(open('{_CODE_DIR}/{_CODE_FILENAME}', encoding='utf-8').read(), '<string>', 'exec'))"
+]
+
+# 在执行命令前进入工作目录（不存在时由执行用户创建），省去单独一次mkdir的exec调用；
+# $0 为工作目录，其余参数为要执行的命令
+_ENTER_WORK_DIR_SCRIPT = 'mkdir -p -- "$0" && cd -- "$0" && exec "$@"'
+
+# base64分块编码的读取大小，必须是3的倍数才能保证分块编码结果与整体编码一致
+_BASE64_CHUNK_SIZE = 3 * 16 * 1024
+
+
+def _encode_base64(file_obj: BinaryIO) -> Tuple[str, int]:
+    """分块读取文件并编码为base64，返回编码结果和原始字节数"""
+    encoded = bytearray()
+    size = 0
+    while chunk := file_obj.read(_BASE64_CHUNK_SIZE):
+        encoded += base64.b64encode(chunk)
+        size += len(chunk)
+    return encoded.decode('ascii'), size
+
+
+def _read_capped(chunks: Iterable[bytes], limit: int) -> bytes:
+    """按块读取输出，超过上限后停止读取，最多多保留一个分块用于判断是否截断"""
+    output = bytearray()
+    for chunk in chunks:
+        output += chunk
+        if len(output) > limit:
+            break
+    return bytes(output)
+
+
+def _decode_output(output: bytes) -> str:
+    """解码执行输出，超过MAX_LOG_BYTES的部分截断并附加提示"""
+    if len(output) <= config.MAX_LOG_BYTES:
+        return output.decode('utf-8', errors='replace')
+    text = output[:config.MAX_LOG_BYTES].decode('utf-8', errors='replace')
+    return f"{text}\n[output truncated at {config.MAX_LOG_BYTES} bytes]"
+
+
+def _sandbox_owned(info: tarfile.TarInfo) -> tarfile.TarInfo:
+    """将tar成员的属主设为容器内的执行用户，并设置统一的权限"""
+    info.uid = info.gid = config.CONTAINER_UID
+    info.uname = info.gname = ""
+    info.mode = 0o755 if info.isdir() else 0o644
+    return info
+
+
+class _ChunkStream(io.RawIOBase):
+    """将按块产出字节的迭代器包装为只读文件对象，供tarfile流模式读取"""
+    
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b"")
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            try:
+                self._pending = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
 
 class SandboxService:
     """沙盒执行服务类"""
@@ -28,10 +110,31 @@ class SandboxService:
     def __init__(self):
         self.docker_service = DockerService()
         self.file_service = FileService()
+        self.container_pool: Optional[ContainerPool] = None
+        # 持有后台清理任务的强引用，防止任务在完成前被垃圾回收
+        self._background_tasks: Set[asyncio.Task] = set()
         
         if not self.docker_service.is_available():
             logger.error("无法初始化SandboxService：Docker服务不可用")
     
+    async def startup(self) -> None:
+        """应用启动时初始化共享资源"""
+        await self.file_service.startup()
+        
+        if config.CONTAINER_POOL_SIZE > 0 and self.docker_service.is_available():
+            self.container_pool = ContainerPool(self.docker_service, config.CONTAINER_POOL_SIZE)
+            await self.container_pool.start()
+    
+    async def shutdown(self) -> None:
+        """应用关闭时释放共享资源"""
+        if self._background_tasks:
+            await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        
+        if self.container_pool:
+            await self.container_pool.shutdown()
+            self.container_pool = None
+        await self.file_service.shutdown()
+    
     async def execute_code(
         self, 
         code: str, 
@@ -44,7 +147,15 @@ class SandboxService:
             raise HTTPException(status_code=503, detail="Docker服务不可用")
         
         if timeout is None:
-            timeout = config.DEFAULT_TIMEOUT
+            timeout = config.CONTAINER_TIMEOUT
+        
+        # 池中暂无空闲容器时不排队等待，退回按需创建新容器
+        # 取出容器时记下所属的池，执行期间服务关闭也能把容器交还给原来的池
+        pool = self.container_pool
+        if pool:
+            container = pool.try_acquire()
+            if container is not None:
+                return await self._execute_in_pool(pool, container, code, timeout, work_dir_str, ref_files)
         
         docker_client = self.docker_service.get_client()
         container_name = f"sandbox-{uuid.uuid4().hex[:8]}"
@@ -52,155 +163,295 @@ class SandboxService:
         
         try:
             # 创建宿主机工作目录
-            host_work_dir = tempfile.mkdtemp(prefix=f"sandbox_{container_name}_")
+            host_work_dir = str(self.file_service.create_work_dir(f"sandbox_{container_name}_"))
             logger.info(f"创建宿主机工作目录: {host_work_dir}")
             
+            if config.SANDBOX_WORK_DIR_SHARED:
+                # 挂载目录由容器内的sandbox用户读写，mkdtemp创建的目录仅属主可访问
+                os.chmod(host_work_dir, 0o777)
+            
             # 下载引用文件到宿主机工作目录
             if ref_files:
                 logger.info(f"开始下载 {len(ref_files)} 个引用文件到宿主机挂载目录")
                 await self.file_service.download_ref_files(ref_files, Path(host_work_dir))
                 logger.info(f"已下载 {len(ref_files)} 个文件到宿主机挂载目录")
             
-            # 创建并启动容器
-            container_args = {
-                'image': self.docker_service.image_name,
-                'command': ["python", "-c", code],
-                'name': container_name,
-                'detach': True,
-                'remove': False,  # 先不自动删除，方便获取日志
-                'mem_limit': self.docker_service.container_config['mem_limit'],
-                'cpu_quota': self.docker_service.container_config['cpu_quota'],
-                'network_disabled': self.docker_service.container_config['network_disabled'],
-                'security_opt': self.docker_service.container_config['security_opt'],
-                'user': self.docker_service.container_config['user'],
-                'volumes': {host_work_dir: {'bind': work_dir_str, 'mode': 'rw'}},  # 挂载工作目录
-            }
-            
-            container = docker_client.containers.run(**container_args)
-            logger.info(f"容器 {container_name} 已创建，等待执行完成")
-            
-            # 如果有引用文件，将它们复制到容器内
-            if ref_files and host_work_dir:
-                await self._copy_files_to_container(container, host_work_dir)
-            
-            # 等待容器执行完成
-            result = container.wait(timeout=timeout)
-            exit_code = result['StatusCode']
+            # 只有工作目录与守护进程共享时才挂载：否则守护进程会在它所在的主机上新建同名目录，
+            # 执行产生的文件残留在那里且无人清理；不挂载时工作目录位于容器自身的可写层，随容器一起删除
+            binds = {}
+            if config.SANDBOX_WORK_DIR_SHARED:
+                binds[host_work_dir] = {'bind': work_dir_str, 'mode': 'rw'}
+            
+            # 创建容器，放入代码后再启动
+            container = await asyncio.to_thread(
+                self.docker_service.create_container,
+                command=_RUN_CODE_COMMAND,
+                name=container_name,
+                working_dir=work_dir_str,  # 代码在工作目录中运行，相对路径即指向工作目录
+                binds=binds
+            )
+            await asyncio.to_thread(self._put_code, container, code)
+            
+            # 未挂载时在启动前将引用文件复制到容器内；工作目录是/data的子目录时，
+            # 同时以执行用户的身份创建该目录，否则它会在启动时以root身份创建
+            if not config.SANDBOX_WORK_DIR_SHARED and (ref_files or work_dir_str != "/data"):
+                await self._copy_files_to_container(container, host_work_dir, work_dir_str)
+            
+            await asyncio.to_thread(container.start)
+            logger.info(f"容器 {container_name} 已启动，等待执行完成")
+            
+            # 等待容器执行完成，超时则终止容器并返回已产生的输出
+            exit_code, timed_out = await asyncio.to_thread(self._wait_container, container, timeout)
             
             logger.info(f"容器 {container_name} 执行完成，退出码: {exit_code}")
             
             # 提取生成的图片文件
-            generated_images = await self._extract_images_from_container(container)
+            generated_images = await self._extract_images_from_container(container, work_dir_str)
             
             # 获取输出日志
-            logs = container.logs(stdout=True, stderr=True).decode('utf-8')
+            logs = await asyncio.to_thread(self._fetch_logs, container)
             
             return ExecuteResponse(
                 success=exit_code == 0,
-                output=logs,
+                output=_decode_output(logs),
                 exit_code=exit_code,
                 container_id=container.id[:12],
-                generated_images=generated_images
+                generated_images=generated_images,
+                error_message=f"Execution timed out after {timeout}s" if timed_out else None
             )
             
-        except docker.errors.ContainerError as e:
-            logger.error(f"容器执行错误: {e}")
-            return ExecuteResponse(
-                success=False,
-                output=str(e),
-                exit_code=e.exit_status,
-                container_id=container_name,
-                generated_images=[],
-                error_message=f"Container execution failed: {str(e)}"
-            )
+        except HTTPException:
+            raise
             
         except Exception as e:
             logger.error(f"代码执行失败: {e}")
             raise HTTPException(status_code=500, detail=f"Execution failed: {str(e)}")
             
         finally:
-            # 清理资源
-            await self._cleanup_resources(docker_client, container_name, host_work_dir)
+            # 清理资源放到后台执行，不阻塞响应返回
+            self._run_in_background(
+                self._cleanup_resources(docker_client, container_name, host_work_dir)
+            )
     
-    async def _copy_files_to_container(self, container, host_work_dir: str) -> None:
-        """将文件复制到容器内"""
+    async def _execute_in_pool(
+        self,
+        pool: ContainerPool,
+        container,
+        code: str,
+        timeout: int,
+        work_dir_str: str,
+        ref_files: Optional[List[RefFile]]
+    ) -> ExecuteResponse:
+        """在预热容器池取出的容器内执行代码"""
+        healthy = True
+        host_work_dir = None
+        
         try:
-            # 创建tar文件包含所有下载的文件
-            tar_buffer = io.BytesIO()
-            with tarfile.open(fileobj=tar_buffer, mode='w') as tar:
-                for file_path in os.listdir(host_work_dir):
-                    full_path = os.path.join(host_work_dir, file_path)
-                    if os.path.isfile(full_path):
-                        tar.add(full_path, arcname=file_path)
+            # 引用文件无法挂载到已启动的容器，下载后复制进容器
+            if ref_files:
+                host_work_dir = str(self.file_service.create_work_dir(f"sandbox_{container.name}_"))
+                await self.file_service.download_ref_files(ref_files, Path(host_work_dir))
+                await self._copy_files_to_container(container, host_work_dir, work_dir_str)
             
-            tar_buffer.seek(0)
+            await asyncio.to_thread(self._put_code, container, code)
             
-            # 将文件复制到容器的/data目录
-            container.put_archive('/data', tar_buffer.getvalue())
+            # 预热容器中只预建了/data，其它工作目录在执行前创建
+            # timeout 超时后先发送 SIGTERM，1秒后仍未退出则发送 SIGKILL
+            started = time.monotonic()
+            exit_code, output = await asyncio.to_thread(
+                self._exec_capped,
+                container,
+                [
+                    "sh", "-c", _ENTER_WORK_DIR_SCRIPT, work_dir_str,
+                    "timeout", "-k", "1", str(timeout), *_RUN_CODE_COMMAND
+                ]
+            )
+            elapsed = time.monotonic() - started
+            logger.info(f"容器 {container.name} 执行完成，退出码: {exit_code}")
             
-            # 设置正确的权限
-            container.exec_run("chown -R sandbox:sandbox /data", user="root")
-            container.exec_run("chmod -R 644 /data/*", user="root")
+            if exit_code is None:
+                # 输出流结束时命令仍未退出，容器状态不可信，不再复用
+                healthy = False
+                exit_code = -1
             
-            logger.info(f"已将 {len(os.listdir(host_work_dir))} 个引用文件复制到容器内")
+            # 用户代码自身也可能以124退出或因内存超限被SIGKILL，只有运行时间达到限制时才算超时
+            timed_out = exit_code in (124, 137) and elapsed >= timeout
+            if timed_out:
+                # 超时的容器可能残留失控进程，不再复用
+                healthy = False
+            
+            generated_images = await self._extract_images_from_container(container, work_dir_str)
+            
+            return ExecuteResponse(
+                success=exit_code == 0,
+                output=_decode_output(output),
+                exit_code=exit_code,
+                container_id=container.id[:12],
+                generated_images=generated_images,
+                error_message=f"Execution timed out after {timeout}s" if timed_out else None
+            )
+            
+        except HTTPException:
+            raise
+            
+        except Exception as e:
+            healthy = False
+            logger.error(f"代码执行失败: {e}")
+            raise HTTPException(status_code=500, detail=f"Execution failed: {str(e)}")
+            
+        finally:
+            # 容器重置完成后才会回到池中，无需在返回响应前等待
+            self._run_in_background(pool.release(container, healthy))
+            if host_work_dir:
+                self.file_service.schedule_cleanup(Path(host_work_dir))
+    
+    async def _copy_files_to_container(self, container, host_work_dir: str, work_dir_str: str) -> None:
+        """将文件复制到容器内"""
+        try:
+            count = await asyncio.to_thread(
+                self._put_work_files, container, host_work_dir, work_dir_str
+            )
+            logger.info(f"已将 {count} 个引用文件复制到容器内")
             
         except Exception as e:
             logger.error(f"文件复制到容器失败: {e}")
     
-    async def _extract_images_from_container(self, container) -> List[ImageFile]:
-        """从容器内提取图片文件"""
-        generated_images = []
+    @staticmethod
+    def _fetch_logs(container) -> bytes:
+        """流式读取容器输出，超过上限后不再继续接收"""
+        stream = container.logs(stdout=True, stderr=True, stream=True)
+        try:
+            return _read_capped(stream, config.MAX_LOG_BYTES)
+        finally:
+            stream.close()
+    
+    @staticmethod
+    def _exec_capped(container, command: List[str]) -> Tuple[Optional[int], bytes]:
+        """在容器内执行命令并流式读取输出，只保留MAX_LOG_BYTES以内的部分；返回退出码和输出"""
+        # exec_run 不流式读取时会把全部输出读入内存，且流式模式下拿不到退出码，因此直接使用底层API
+        api = container.client.api
+        exec_id = api.exec_create(container.id, command)['Id']
+        stream = api.exec_start(exec_id, stream=True, demux=False)
+        try:
+            output = _read_capped(stream, config.MAX_LOG_BYTES)
+            # 超出上限的输出读出后直接丢弃，等待命令结束（由timeout兜底）以取得退出码
+            for _ in stream:
+                pass
+        finally:
+            stream.close()
+        return api.exec_inspect(exec_id)['ExitCode'], output
+    
+    @staticmethod
+    def _put_code(container, code: str) -> None:
+        """将用户代码写入容器内的代码文件"""
+        data = code.encode('utf-8')
+        # 代码文件归执行用户所有：/tmp带粘滞位，否则预热容器重置时sandbox用户无法删除该文件
+        info = _sandbox_owned(tarfile.TarInfo(_CODE_FILENAME))
+        info.size = len(data)
+        
+        tar_buffer = io.BytesIO()
+        with tarfile.open(fileobj=tar_buffer, mode='w') as tar:
+            tar.addfile(info, io.BytesIO(data))
+        container.put_archive(_CODE_DIR, tar_buffer.getvalue())
+    
+    @staticmethod
+    def _put_work_files(container, host_work_dir: str, work_dir_str: str) -> int:
+        """打包工作目录中的文件并上传到容器，返回文件数量"""
+        # 单次遍历工作目录，DirEntry自带文件类型，无需逐个stat；子目录随tar递归打包
+        with os.scandir(host_work_dir) as it:
+            entries = [entry for entry in it if entry.is_file() or entry.is_dir()]
         
+        # 成员路径带上工作目录并解压到根目录，工作目录不存在时由解压过程创建，无需先mkdir
+        arc_root = work_dir_str.strip('/')
+        # 解压以root身份进行且会改写目录属主，只允许落在/data之内（路由层已校验，这里兜底）
+        parts = PurePosixPath(arc_root).parts
+        if parts[:1] != ('data',) or '..' in parts:
+            raise ValueError(f"工作目录必须在/data路径下: {work_dir_str}")
+        
+        # tar包写入临时文件并以文件对象上传，上传时流式读取，不在内存中保留完整副本
+        with tempfile.TemporaryFile() as tar_file:
+            with tarfile.open(fileobj=tar_file, mode='w') as tar:
+                # 先写入/data到工作目录之间的各级目录，解压后归执行用户所有，用户代码才能在其中写入文件
+                for depth in range(1, len(parts) + 1):
+                    tar.add(
+                        host_work_dir,
+                        arcname=posixpath.join(*parts[:depth]),
+                        recursive=False,
+                        filter=_sandbox_owned
+                    )
+                for entry in entries:
+                    tar.add(
+                        entry.path,
+                        arcname=posixpath.join(arc_root, entry.name),
+                        filter=_sandbox_owned
+                    )
+            
+            tar_file.seek(0)
+            
+            # 将文件复制到容器的工作目录，解压时沿用tar头中的属主和权限，无需再执行chown/chmod
+            container.put_archive("/", tar_file)
+        
+        return len(entries)
+    
+    async def _extract_images_from_container(self, container, work_dir_str: str) -> List[ImageFile]:
+        """从容器内提取图片文件"""
         try:
-            # 支持的图片格式
-            image_extensions = ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg']
+            # 下载、解析tar包和base64编码都是阻塞操作，整体放到线程中执行
+            generated_images = await asyncio.to_thread(
+                self._collect_images, container, work_dir_str
+            )
+            logger.info(f"发现 {len(generated_images)} 个图片文件")
+            return generated_images
             
-            # 从容器内获取/data目录的内容
-            try:
-                # 获取容器内/data目录的tar包
-                bits, stat = container.get_archive('/data')
-                
-                # 解析tar包
-                tar_stream = io.BytesIO()
-                for chunk in bits:
-                    tar_stream.write(chunk)
-                tar_stream.seek(0)
-                
-                with tarfile.open(fileobj=tar_stream, mode='r') as tar:
-                    for member in tar.getmembers():
-                        if member.isfile():
-                            # 检查是否是图片文件
-                            filename = os.path.basename(member.name)
-                            if any(filename.lower().endswith(ext) for ext in image_extensions):
-                                try:
-                                    # 提取文件内容
-                                    file_obj = tar.extractfile(member)
-                                    if file_obj:
-                                        file_content = file_obj.read()
-                                        
-                                        # 转换为base64
-                                        base64_content = base64.b64encode(file_content).decode('utf-8')
-                                        
-                                        generated_images.append(ImageFile(
-                                            filename=filename,
-                                            content=base64_content,
-                                            size=len(file_content)
-                                        ))
-                                        
-                                        logger.info(f"已提取图片文件: {filename} ({len(file_content)} bytes)")
-                                except Exception as e:
-                                    logger.warning(f"提取图片文件失败 {filename}: {e}")
-                
-                logger.info(f"发现 {len(generated_images)} 个图片文件")
-                
-            except Exception as e:
-                logger.warning(f"从容器提取文件失败: {e}")
-                
         except Exception as e:
-            logger.warning(f"图片提取过程失败: {e}")
+            logger.warning(f"从容器提取文件失败: {e}")
+            return []
+    
+    @staticmethod
+    def _collect_images(container, work_dir_str: str) -> List[ImageFile]:
+        """流式读取容器内工作目录的tar包，提取其中的图片文件"""
+        generated_images = []
+        
+        # 获取容器内工作目录的tar包
+        bits, _ = container.get_archive(work_dir_str)
+        
+        # 以流模式边接收边解析，不在内存中缓存整个tar包
+        with tarfile.open(fileobj=_ChunkStream(bits), mode='r|') as tar:
+            for member in tar:
+                if member.isreg():
+                    # 检查是否是图片文件
+                    filename = os.path.basename(member.name)
+                    _, dot, extension = filename.rpartition('.')
+                    if dot and extension.lower() in _IMAGE_EXTENSIONS:
+                        try:
+                            # 流模式下成员内容只能在迭代到该成员时读取
+                            file_obj = tar.extractfile(member)
+                            if file_obj:
+                                # 分块转换为base64，避免同时持有原始内容和编码结果
+                                base64_content, size = _encode_base64(file_obj)
+                                
+                                generated_images.append(ImageFile(
+                                    filename=filename,
+                                    content=base64_content,
+                                    size=size
+                                ))
+                                
+                                logger.info(f"已提取图片文件: {filename} ({size} bytes)")
+                        except Exception as e:
+                            logger.warning(f"提取图片文件失败 {filename}: {e}")
         
         return generated_images
     
+    @staticmethod
+    def _wait_container(container, timeout: int) -> Tuple[int, bool]:
+        """等待容器退出，超时则终止容器；返回退出码和是否超时"""
+        try:
+            return container.wait(timeout=timeout)['StatusCode'], False
+        except (requests.exceptions.ReadTimeout, requests.exceptions.ConnectionError):
+            logger.warning(f"容器 {container.name} 执行超时（{timeout}秒），终止容器")
+            container.kill()
+            return container.wait(timeout=10)['StatusCode'], True
+    
     async def _cleanup_resources(
         self, 
         docker_client: docker.DockerClient, 
@@ -209,15 +460,25 @@ class SandboxService:
     ) -> None:
         """清理资源"""
         # 清理容器
+        await asyncio.to_thread(self._remove_container, docker_client, container_name)
+        
+        # 清理宿主机工作目录
+        if host_work_dir:
+            self.file_service.schedule_cleanup(Path(host_work_dir))
+    
+    @staticmethod
+    def _remove_container(docker_client: docker.DockerClient, container_name: str) -> None:
+        """强制删除容器"""
         try:
-            container = docker_client.containers.get(container_name)
-            container.remove(force=True)
+            docker_client.api.remove_container(container_name, force=True)
             logger.info(f"容器 {container_name} 已清理")
         except docker.errors.NotFound:
             pass  # 容器已经不存在
         except Exception as e:
             logger.warning(f"清理容器失败: {e}")
-        
-        # 清理宿主机工作目录
-        if host_work_dir:
-            self.file_service.cleanup_directory(Path(host_work_dir))
\ No newline at end of file
+    
+    def _run_in_background(self, coro: Coroutine) -> None:
+        """在后台运行清理任务，不阻塞当前请求"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
\ No newline at end of file
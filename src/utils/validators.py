@@ -1,5 +1,6 @@
 """验证器工具"""
 
+import posixpath
 from typing import Optional
 from fastapi import HTTPException
 
@@ -8,13 +9,6 @@ def validate_code(code: str) -> None:
     """验证代码内容"""
     if not code or not code.strip():
         raise HTTPException(status_code=400, detail="代码不能为空")
-    
-    # 可以添加更多验证逻辑，比如检查危险操作
-    dangerous_imports = ['subprocess', 'os.system', 'eval', 'exec']
-    for dangerous in dangerous_imports:
-        if dangerous in code:
-            # 这里可以根据需要决定是否完全禁止或者只是警告
-            pass
 
 
 def validate_timeout(timeout: Optional[int]) -> None:
@@ -27,11 +21,16 @@ def validate_timeout(timeout: Optional[int]) -> None:
             )
 
 
-def validate_work_dir(work_dir: str) -> None:
-    """验证工作目录"""
-    # 确保工作目录是安全的
-    if not work_dir.startswith('/data'):
+def validate_work_dir(work_dir: Optional[str]) -> str:
+    """验证工作目录，返回规范化后的路径"""
+    # 引用文件以root身份解压到工作目录，图片也从中提取，必须限制在/data之内；
+    # 先规范化再比较，避免 /data/../etc 或 /database 之类的路径绕过检查
+    if work_dir is None:
+        return "/data"
+    normalized = posixpath.normpath(work_dir)
+    if normalized != "/data" and not normalized.startswith("/data/"):
         raise HTTPException(
             status_code=400,
             detail="工作目录必须在/data路径下"
-        )
\ No newline at end of file
+        )
+    return normalized
@@ -0,0 +1,67 @@
+"""
+pytest共享夹具
+"""
+
+import os
+import time
+import pytest
+import requests
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "live: 需要运行中的沙盒服务（真实Docker容器）的测试")
+
+
+def _wait_for_service(base_url: str, max_wait: float = 30) -> bool:
+    """用HEAD请求轮询健康检查接口，间隔从50毫秒开始指数增长，最长1秒"""
+    deadline = time.monotonic() + max_wait
+    delay = 0.05
+    with requests.Session() as session:
+        session.trust_env = False
+        while True:
+            try:
+                response = session.head(f"{base_url}/health", timeout=2)
+                if response.status_code == 200:
+                    return True
+            except requests.exceptions.RequestException:
+                pass
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 1.0)
+
+
+@pytest.fixture(scope="session")
+def sandbox_service(tmp_path_factory):
+    """整个测试会话只等待一次服务启动
+
+    使用pytest-xdist时每个worker都会执行session夹具，这里借助所有worker共享的
+    临时目录和文件锁，只让第一个拿到锁的worker轮询，其余worker直接读取结果。
+    """
+    base_url = os.getenv('SANDBOX_URL', 'http://localhost:16009')
+    # 没有运行沙盒服务的环境（如本地开发、无Docker的CI）设置为true：只探测一次，不可达时跳过测试
+    skip_offline = os.getenv("SANDBOX_SKIP_OFFLINE", "false").lower() == "true"
+    max_wait = 0 if skip_offline else 30
+    
+    # 未使用pytest-xdist时没有该环境变量
+    if not os.getenv("PYTEST_XDIST_WORKER"):
+        ready = _wait_for_service(base_url, max_wait)
+    else:
+        from filelock import FileLock
+        
+        shared_dir = tmp_path_factory.getbasetemp().parent
+        marker = shared_dir / "sandbox_service_ready"
+        with FileLock(str(marker) + ".lock"):
+            if marker.is_file():
+                ready = marker.read_text() == "ok"
+            else:
+                ready = _wait_for_service(base_url, max_wait)
+                marker.write_text("ok" if ready else "failed")
+    
+    if not ready:
+        if skip_offline:
+            pytest.skip(f"沙盒服务 {base_url} 不可达")
+        pytest.fail(f"服务 {base_url} 未能在30秒内启动", pytrace=False)
+    return base_url
@@ -3,9 +3,13 @@
 测试API接口和Pydantic模型的正确性
 """
 
+import pytest
 import requests
 import json
 
+# 依赖运行中的沙盒服务，使用 pytest -m "not live" 可跳过；由conftest.py中的会话级夹具统一等待服务启动
+pytestmark = [pytest.mark.live, pytest.mark.usefixtures("sandbox_service")]
+
 def test_api_schema():
     """测试API接口是否正确接受新的参数格式"""
     
@@ -5,6 +5,7 @@
 """
 
 import unittest
+import pytest
 import requests
 import time
 import threading
@@ -14,6 +15,11 @@ import sys
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Any
 
+# 依赖运行中的沙盒服务，使用 pytest -m "not live" 可跳过
+pytestmark = pytest.mark.live
+
+# 由conftest.py中的会话级夹具统一等待服务启动
+@pytest.mark.usefixtures("sandbox_service")
 class TestSandboxPerformance(unittest.TestCase):
     """沙盒性能测试类"""
     
@@ -21,24 +27,6 @@ class TestSandboxPerformance(unittest.TestCase):
         """测试前准备"""
         self.base_url = os.getenv('SANDBOX_URL', 'http://localhost:16009')
         self.timeout = 60
-        
-        # 确保服务可用
-        self._wait_for_service()
-    
-    def _wait_for_service(self, max_attempts: int = 30):
-        """等待服务启动"""
-        for attempt in range(max_attempts):
-            try:
-                response = requests.get(f"{self.base_url}/health", timeout=5)
-                if response.status_code == 200:
-                    return
-            except requests.exceptions.RequestException:
-                pass
-            
-            if attempt < max_attempts - 1:
-                time.sleep(1)
-        
-        self.fail(f"服务在 {max_attempts} 秒内未启动")
     
     def _execute_code_with_timing(self, code: str, language: str = "python") -> Dict[str, Any]:
         """执行代码并记录时间"""
@@ -165,11 +153,12 @@ class TestSandboxPerformance(unittest.TestCase):
 import time
 start = time.time()
 
-# CPU密集型计算：计算斐波那契数列
+# CPU密集型计算：迭代计算斐波那契数列
 def fibonacci(n):
-    if n <= 1:
-        return n
-    return fibonacci(n-1) + fibonacci(n-2)
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
 
 result = fibonacci(30)
 end = time.time()
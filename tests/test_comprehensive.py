@@ -4,43 +4,46 @@
 测试完整的API功能和各种代码执行场景
 """
 
+import re
 import unittest
+import pytest
 import requests
-import time
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 import json
 import sys
 import os
 from typing import Dict, Any
 
+# 依赖运行中的沙盒服务，使用 pytest -m "not live" 可跳过
+pytestmark = pytest.mark.live
+
+BASE_URL = os.environ.get('SANDBOX_URL', 'http://localhost:16009')
+TIMEOUT = 30
+
+# 由conftest.py中的会话级夹具统一等待服务启动
+@pytest.mark.usefixtures("sandbox_service")
 class TestSandboxAPI(unittest.TestCase):
     """沙盒API综合测试类"""
     
-    def setUp(self):
-        """测试前准备"""
-        self.base_url = os.getenv('SANDBOX_URL', 'http://localhost:16009')
-        self.timeout = 30
-        
-        # 等待服务启动
-        self._wait_for_service()
+    # 标准库导入测试的预期输出，按打印顺序匹配
+    EXPECTED_IMPORTS = re.compile(r'π = 3\.1416\n.*JSON: ', re.S)
     
-    def _wait_for_service(self, max_attempts: int = 30):
-        """等待服务启动"""
-        for attempt in range(max_attempts):
-            try:
-                response = requests.get(f"{self.base_url}/health", timeout=5)
-                if response.status_code == 200:
-                    return
-            except requests.exceptions.RequestException:
-                pass
-            
-            if attempt < max_attempts - 1:
-                time.sleep(1)
-        
-        self.fail(f"服务在 {max_attempts} 秒内未启动")
+    @classmethod
+    def setUpClass(cls):
+        """所有测试共享一个HTTP会话，复用keep-alive连接"""
+        cls.base_url = BASE_URL
+        cls.timeout = TIMEOUT
+        cls.session = requests.Session()
+        cls.session.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.session.close()
     
     def _execute_code(self, code: str, language: str = "python") -> Dict[str, Any]:
         """执行代码的辅助方法"""
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/execute",
             json={"code": code, "language": language},
             timeout=self.timeout
@@ -50,7 +53,7 @@ class TestSandboxAPI(unittest.TestCase):
     
     def test_health_endpoint(self):
         """测试健康检查端点"""
-        response = requests.get(f"{self.base_url}/health")
+        response = self.session.get(f"{self.base_url}/health")
         self.assertEqual(response.status_code, 200)
         
         data = response.json()
@@ -93,9 +96,7 @@ for i in range(5):
         self.assertEqual(result['exit_code'], 0)
         
         output_lines = result['output'].strip().split('\n')
-        self.assertEqual(len(output_lines), 5)
-        for i, line in enumerate(output_lines):
-            self.assertIn(f"数字: {i}", line)
+        self.assertEqual(output_lines, [f"数字: {i}" for i in range(5)])
     
     def test_python_with_functions(self):
         """测试包含函数的Python代码"""
@@ -131,8 +132,7 @@ print(f"JSON: {json.dumps(data)}")
         
         self.assertTrue(result['success'])
         self.assertEqual(result['exit_code'], 0)
-        self.assertIn('π = 3.1416', result['output'])
-        self.assertIn('JSON:', result['output'])
+        self.assertRegex(result['output'], self.EXPECTED_IMPORTS)
     
     def test_python_error_handling(self):
         """测试Python代码错误处理"""
@@ -195,34 +195,20 @@ except MemoryError:
     
     def test_multiple_requests(self):
         """测试多个并发请求"""
-        import threading
-        import queue
-        
-        results = queue.Queue()
-        
         def execute_test_code(thread_id):
             code = f"print('线程 {thread_id} 执行成功')"
             try:
-                result = self._execute_code(code)
-                results.put((thread_id, result))
+                return self._execute_code(code)
             except Exception as e:
-                results.put((thread_id, {'error': str(e)}))
+                return {'error': str(e)}
         
-        # 创建5个线程同时执行
-        threads = []
-        for i in range(5):
-            thread = threading.Thread(target=execute_test_code, args=(i,))
-            threads.append(thread)
-            thread.start()
-        
-        # 等待所有线程完成
-        for thread in threads:
-            thread.join()
+        # 5个请求同时执行，共享类级别会话的连接池
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            results = list(executor.map(execute_test_code, range(5)))
         
         # 检查结果
         successful_results = 0
-        while not results.empty():
-            thread_id, result = results.get()
+        for thread_id, result in enumerate(results):
             if 'error' not in result and result.get('success', False):
                 successful_results += 1
                 self.assertIn(f'线程 {thread_id} 执行成功', result['output'])
@@ -232,7 +218,7 @@ except MemoryError:
     
     def test_invalid_json_request(self):
         """测试无效JSON请求"""
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/execute",
             data="invalid json",
             headers={'Content-Type': 'application/json'},
@@ -242,7 +228,7 @@ except MemoryError:
     
     def test_missing_code_field(self):
         """测试缺少code字段的请求"""
-        response = requests.post(
+        response = self.session.post(
             f"{self.base_url}/execute",
             json={"language": "python"},
             timeout=self.timeout
@@ -256,21 +242,6 @@ except MemoryError:
         self.assertTrue(result['success'])
         self.assertEqual(result['exit_code'], 0)
         self.assertEqual(result['output'].strip(), "")
-    
-    def test_code_with_unicode(self):
-        """测试包含Unicode字符的代码"""
-        code = """
-print("你好，世界！")
-print("🐍 Python 测试")
-print("数学符号: α β γ δ")
-"""
-        result = self._execute_code(code)
-        
-        self.assertTrue(result['success'])
-        self.assertEqual(result['exit_code'], 0)
-        self.assertIn('你好，世界！', result['output'])
-        self.assertIn('🐍 Python 测试', result['output'])
-        self.assertIn('α β γ δ', result['output'])
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -3,12 +3,17 @@
 测试图片生成和提取功能
 """
 
-import requests
+import asyncio
+import httpx
+import pytest
 import json
 import base64
 from pathlib import Path
 
-def test_image_generation():
+# 依赖运行中的沙盒服务，使用 pytest -m "not live" 可跳过；由conftest.py中的会话级夹具统一等待服务启动
+pytestmark = [pytest.mark.live, pytest.mark.usefixtures("sandbox_service")]
+
+async def run_image_generation(client: httpx.AsyncClient):
     """测试代码执行后图片文件的生成和提取"""
     
     # 测试代码：生成一个简单的matplotlib图片
@@ -55,7 +60,7 @@ print("图片已生成: bar_chart.png")
     }
     
     print("发送图片生成测试请求...")
-    response = requests.post(url, json=payload, proxies={'http': None, 'https': None})
+    response = await client.post(url, json=payload)
     
     print(f"状态码: {response.status_code}")
     
@@ -79,10 +84,10 @@ print("图片已生成: bar_chart.png")
                 
                 # 可选：保存图片到本地进行验证
                 try:
-                    image_data = base64.b64decode(content)
                     output_path = Path(f"./test_output_{filename}")
+                    # base64内容只含ASCII字符，先编码为bytes再解码，解码结果直接写入文件
                     with open(output_path, 'wb') as f:
-                        f.write(image_data)
+                        f.write(base64.b64decode(content.encode('ascii')))
                     print(f"     已保存到: {output_path}")
                 except Exception as e:
                     print(f"     保存失败: {e}")
@@ -91,5 +96,17 @@ print("图片已生成: bar_chart.png")
     else:
         print(f"请求失败: {response.text}")
 
+async def main():
+    # trust_env=False不读取环境变量中的代理配置
+    async with httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        timeout=60.0,
+        trust_env=False
+    ) as client:
+        await run_image_generation(client)
+
+def test_image_generation():
+    asyncio.run(main())
+
 if __name__ == "__main__":
-    test_image_generation()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
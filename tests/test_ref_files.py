@@ -3,15 +3,35 @@
 测试RefFiles功能的示例脚本
 """
 
-import requests
+import asyncio
+import os
+import httpx
+import pytest
 import json
 
-def test_ref_files():
+# 依赖运行中的沙盒服务，使用 pytest -m "not live" 可跳过；由conftest.py中的会话级夹具统一等待服务启动
+pytestmark = [pytest.mark.live, pytest.mark.usefixtures("sandbox_service")]
+
+BASE_URL = os.getenv('SANDBOX_URL', 'http://127.0.0.1:16009')
+
+# 同一轮测试中的请求共享连接池，复用keep-alive连接
+LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10)
+
+
+def _new_client() -> httpx.AsyncClient:
+    """创建测试用的异步客户端，不读取环境变量中的代理配置"""
+    return httpx.AsyncClient(base_url=BASE_URL, limits=LIMITS, timeout=60.0, trust_env=False)
+
+
+async def _run(*cases):
+    """用同一个客户端依次执行测试用例"""
+    async with _new_client() as client:
+        for case in cases:
+            await case(client)
+
+async def run_ref_files(client: httpx.AsyncClient):
     """测试带有引用文件的代码执行"""
     
-    # API端点
-    url = "http://127.0.0.1:16009/execute"
-    
     # 测试数据 - 包含引用文件
     test_data = {
         "code": """
@@ -43,12 +63,7 @@ if os.path.exists('/data'):
     
     try:
         # 发送请求
-        response = requests.post(
-            url, 
-            json=test_data,
-            proxies={'http': None, 'https': None},
-            timeout=60
-        )
+        response = await client.post("/execute", json=test_data, timeout=60)
         
         print(f"状态码: {response.status_code}")
         print(f"响应: {json.dumps(response.json(), indent=2, ensure_ascii=False)}")
@@ -56,23 +71,16 @@ if os.path.exists('/data'):
     except Exception as e:
         print(f"请求失败: {e}")
 
-def test_without_ref_files():
+async def run_without_ref_files(client: httpx.AsyncClient):
     """测试不带引用文件的代码执行"""
     
-    url = "http://127.0.0.1:16009/execute"
-    
     test_data = {
         "code": "print('Hello, World!')",
         "timeout": 30
     }
     
     try:
-        response = requests.post(
-            url, 
-            json=test_data,
-            proxies={'http': None, 'https': None},
-            timeout=30
-        )
+        response = await client.post("/execute", json=test_data, timeout=30)
         
         print(f"状态码: {response.status_code}")
         print(f"响应: {json.dumps(response.json(), indent=2, ensure_ascii=False)}")
@@ -80,9 +88,19 @@ def test_without_ref_files():
     except Exception as e:
         print(f"请求失败: {e}")
 
+def test_ref_files():
+    asyncio.run(_run(run_ref_files))
+
+def test_without_ref_files():
+    asyncio.run(_run(run_without_ref_files))
+
+async def main():
+    async with _new_client() as client:
+        print("=== 测试不带引用文件的执行 ===")
+        await run_without_ref_files(client)
+        
+        print("\n=== 测试带引用文件的执行 ===")
+        await run_ref_files(client)
+
 if __name__ == "__main__":
-    print("=== 测试不带引用文件的执行 ===")
-    test_without_ref_files()
-    
-    print("\n=== 测试带引用文件的执行 ===")
-    test_ref_files()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
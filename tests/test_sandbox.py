@@ -5,27 +5,44 @@
 """
 
 import unittest
+import pytest
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import os
 import sys
 
+# 依赖运行中的沙盒服务，使用 pytest -m "not live" 可跳过
+pytestmark = pytest.mark.live
+
+BASE_URL = os.environ.get('SANDBOX_URL', 'http://127.0.0.1:16009')
+TIMEOUT = 10
+
+# 由conftest.py中的会话级夹具统一等待服务启动
+@pytest.mark.usefixtures("sandbox_service")
 class TestSandboxBasic(unittest.TestCase):
     """沙盒基本功能测试类"""
     
-    def setUp(self):
-        """测试前准备"""
-        self.base_url = os.getenv('SANDBOX_URL', 'http://127.0.0.1:16009')
-        self.timeout = 10
-        # 禁用代理以避免502错误
-        self.proxies = {'http': None, 'https': None}
+    @classmethod
+    def setUpClass(cls):
+        """所有测试共享一个HTTP会话，复用keep-alive连接"""
+        cls.base_url = BASE_URL
+        cls.timeout = TIMEOUT
+        cls.session = requests.Session()
+        cls.session.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+        # 不读取环境变量中的代理配置，避免502错误
+        cls.session.trust_env = False
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.session.close()
     
     def test_service_health(self):
         """测试服务健康状态"""
         print("\n🔍 检查服务健康状态...")
         
         try:
-            response = requests.get(f"{self.base_url}/health", timeout=5, proxies=self.proxies)
+            response = self.session.get(f"{self.base_url}/health", timeout=5)
             print(response)
             self.assertEqual(response.status_code, 200)
             
@@ -45,11 +62,10 @@ class TestSandboxBasic(unittest.TestCase):
         code = "print('Hello from sandbox!')"
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/execute",
                 json={"code": code},
-                timeout=self.timeout,
-                proxies=self.proxies
+                timeout=self.timeout
             )
             
             self.assertEqual(response.status_code, 200)
@@ -84,11 +100,10 @@ print(f"计算结果: {a} + {b} = {result}")
 """
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/execute",
                 json={"code": code},
-                timeout=self.timeout,
-                proxies=self.proxies
+                timeout=self.timeout
             )
             
             self.assertEqual(response.status_code, 200)
@@ -118,11 +133,10 @@ print("这行不会执行")
 """
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/execute",
                 json={"code": code},
-                timeout=self.timeout,
-                proxies=self.proxies
+                timeout=self.timeout
             )
             
             self.assertEqual(response.status_code, 200)
@@ -150,11 +164,10 @@ print("这行不会执行")
         
         # 测试缺少code字段的请求
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/execute",
                 json={"language": "python"},
-                timeout=self.timeout,
-                proxies=self.proxies
+                timeout=self.timeout
             )
             
             self.assertEqual(response.status_code, 422)
@@ -168,11 +181,10 @@ print("这行不会执行")
         print("\n📝 测试空代码处理...")
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/execute",
                 json={"code": ""},
-                timeout=self.timeout,
-                proxies=self.proxies
+                timeout=self.timeout
             )
             
             # 空代码应该返回400错误（API设计如此）
@@ -191,14 +203,16 @@ print("这行不会执行")
 print("中文测试: 你好世界")
 print("Emoji测试: 🐍🚀✨")
 print("特殊字符: αβγδε")
+print("你好，世界！")
+print("🐍 Python 测试")
+print("数学符号: α β γ δ")
 """
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/execute",
                 json={"code": code},
-                timeout=self.timeout,
-                proxies=self.proxies
+                timeout=self.timeout
             )
             
             self.assertEqual(response.status_code, 200)
@@ -210,6 +224,9 @@ print("特殊字符: αβγδε")
                 self.assertIn('你好世界', result['output'])
                 self.assertIn('🐍🚀✨', result['output'])
                 self.assertIn('αβγδε', result['output'])
+                self.assertIn('你好，世界！', result['output'])
+                self.assertIn('🐍 Python 测试', result['output'])
+                self.assertIn('α β γ δ', result['output'])
                 
                 print("✅ Unicode字符支持正常")
                 print(f"   输出包含所有Unicode字符")
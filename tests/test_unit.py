@@ -1,113 +1,555 @@
 #!/usr/bin/env python3
 """
 沙盒执行器单元测试
-测试SandboxExecutor类的核心功能
+测试DockerService和SandboxService的核心功能
 """
 
 import unittest
 import asyncio
+import io
+import tarfile
+import tempfile
 import docker
-from unittest.mock import Mock, patch, MagicMock
+import requests
+from pydantic import ValidationError
+from unittest.mock import AsyncMock, MagicMock, patch
 import sys
 import os
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
 
-from main import SandboxExecutor
+from aiohttp import web
+from pathlib import Path
+
+from config import config
+from models.request_models import ExecuteRequest, RefFile, MAX_REF_FILES
+from services.container_pool import ContainerPool, _RESET_SCRIPT
+from services.docker_service import DockerService
+from services.file_cache import FileCache
+from services.file_service import FileService
+from services.sandbox_service import SandboxService, _RUN_CODE_COMMAND
+from utils.validators import validate_work_dir
+from fastapi import HTTPException
 
 class TestSandboxExecutor(unittest.TestCase):
-    """SandboxExecutor单元测试类"""
+    """沙盒执行服务单元测试类"""
     
-    def setUp(self):
-        """测试前准备"""
+    @classmethod
+    def setUpClass(cls):
+        """Mock对象、事件循环和服务实例在所有测试间共享，只构建一次"""
         # Mock Docker客户端
-        self.mock_docker_client = Mock()
-        self.mock_image = Mock()
-        self.mock_container = Mock()
+        cls.mock_docker_client = MagicMock()
+        cls.mock_container = MagicMock()
         
         # 设置mock返回值
-        self.mock_docker_client.images.get.return_value = self.mock_image
-        self.mock_docker_client.containers.run.return_value = self.mock_container
+        cls.mock_docker_client.ping.return_value = True
+        # HostConfig原样返回构建参数，便于检查；服务实例会缓存首次构建的结果
+        cls.mock_docker_client.api.create_host_config.side_effect = lambda **kwargs: kwargs
+        cls.mock_docker_client.api.create_container.return_value = {'Id': "abc123def456789"}
+        cls.mock_docker_client.containers.prepare_model.return_value = cls.mock_container
         
         # Mock容器行为
-        self.mock_container.wait.return_value = {'StatusCode': 0}
-        self.mock_container.logs.return_value = b"Hello, World!\n"
-        self.mock_container.id = "abc123def456789"
-        self.mock_container.remove = Mock()
+        cls.mock_container.wait.return_value = {'StatusCode': 0}
+        cls.mock_container.logs.return_value.__iter__.side_effect = lambda: iter([b"Hello, World!\n"])
+        cls.mock_container.id = "abc123def456789"
+        
+        # 工作目录中没有生成图片
+        tar_buffer = io.BytesIO()
+        with tarfile.open(fileobj=tar_buffer, mode='w') as tar:
+            tar.addfile(tarfile.TarInfo('data'))
+        cls.mock_container.get_archive.side_effect = lambda path: ([tar_buffer.getvalue()], {})
+        
+        # 异常实例同样只创建一次
+        cls.image_not_found = docker.errors.ImageNotFound("Image not found")
+        
+        cls.from_env = patch('docker.from_env', return_value=cls.mock_docker_client)
+        cls.from_env.start()
+        cls.addClassCleanup(cls.from_env.stop)
+        
+        # 所有异步测试共用一个事件循环
+        cls.loop = asyncio.new_event_loop()
+        cls.addClassCleanup(cls.loop.close)
+        
+        cls.service = SandboxService()
+    
+    def setUp(self):
+        """测试前清空调用记录和各测试设置的side_effect"""
+        self.mock_docker_client.reset_mock()
+        self.mock_docker_client.images.get.side_effect = None
+        self.mock_container.reset_mock()
     
-    @patch('main.docker_client')
-    def test_executor_initialization(self, mock_client):
+    def test_executor_initialization(self):
         """测试执行器初始化"""
-        mock_client.images.get.return_value = self.mock_image
+        docker_service = DockerService()
+        
+        self.assertTrue(docker_service.is_available())
+        self.assertEqual(docker_service.image_name, "sandbox-executor")
+        self.mock_docker_client.images.get.assert_called_once_with("sandbox-executor")
+    
+    def test_health_check_ping_cached(self):
+        """测试缓存有效期内的健康检查复用上次ping结果，过期后重新ping"""
+        docker_service = DockerService()
+        # 初始化时的连接检查也会ping，只统计健康检查的调用
+        self.mock_docker_client.ping.reset_mock()
+        clock = MagicMock()
+        clock.monotonic.return_value = 100.0
         
-        executor = SandboxExecutor()
+        with patch.object(config, 'DOCKER_HEALTH_CACHE_TTL', 5.0), \
+                patch('services.docker_service.time', clock):
+            self.assertTrue(self.loop.run_until_complete(docker_service.check_health()))
+            self.assertEqual(self.mock_docker_client.ping.call_count, 1)
+            
+            clock.monotonic.return_value = 104.0
+            self.assertTrue(self.loop.run_until_complete(docker_service.check_health()))
+            self.assertEqual(self.mock_docker_client.ping.call_count, 1)
+            
+            clock.monotonic.return_value = 105.0
+            self.mock_docker_client.ping.side_effect = docker.errors.APIError("down")
+            self.assertFalse(self.loop.run_until_complete(docker_service.check_health()))
+            self.assertEqual(self.mock_docker_client.ping.call_count, 2)
         
-        self.assertEqual(executor.image_name, "sandbox-executor")
-        mock_client.images.get.assert_called_once_with("sandbox-executor")
+        self.mock_docker_client.ping.side_effect = None
     
-    @patch('main.docker_client')
-    def test_image_build_when_not_exists(self, mock_client):
+    def test_missing_image_without_auto_build(self):
+        """测试镜像不存在且未开启自动构建时报错"""
+        self.mock_docker_client.images.get.side_effect = self.image_not_found
+        
+        with patch.object(config, 'EXECUTOR_IMAGE_AUTO_BUILD', False):
+            with self.assertRaises(RuntimeError):
+                DockerService()
+        
+        self.mock_docker_client.images.build.assert_not_called()
+    
+    def test_image_build_when_not_exists(self):
         """测试镜像不存在时自动构建"""
         # 模拟镜像不存在
-        mock_client.images.get.side_effect = docker.errors.ImageNotFound("Image not found")
-        mock_client.images.build.return_value = (self.mock_image, [])
+        self.mock_docker_client.images.get.side_effect = self.image_not_found
         
-        executor = SandboxExecutor()
+        with patch.object(config, 'EXECUTOR_IMAGE_AUTO_BUILD', True):
+            DockerService()
         
         # 验证构建被调用
-        mock_client.images.build.assert_called_once_with(
+        self.mock_docker_client.images.build.assert_called_once_with(
             path=".",
             dockerfile="docker/Dockerfile.executor",
             tag="sandbox-executor",
             rm=True
         )
     
-    @patch('main.docker_client')
-    async def test_successful_code_execution(self, mock_client):
+    def test_successful_code_execution(self):
         """测试成功的代码执行"""
-        mock_client.images.get.return_value = self.mock_image
-        mock_client.containers.run.return_value = self.mock_container
-        
-        executor = SandboxExecutor()
-        result = await executor.execute_code("print('Hello, World!')")
+        result = self.loop.run_until_complete(self._execute("print('Hello, World!')"))
         
         # 验证容器创建参数
-        mock_client.containers.run.assert_called_once()
-        call_args = mock_client.containers.run.call_args
+        self.mock_docker_client.api.create_container.assert_called_once()
+        call_args = self.mock_docker_client.api.create_container.call_args
         
         self.assertEqual(call_args[0][0], "sandbox-executor")  # 镜像名
-        self.assertEqual(call_args[1]['command'], ["python", "-c", "print('Hello, World!')"])
-        self.assertEqual(call_args[1]['mem_limit'], "128m")
-        self.assertEqual(call_args[1]['cpu_quota'], 50000)
+        self.assertEqual(call_args[1]['command'], _RUN_CODE_COMMAND)
         self.assertTrue(call_args[1]['network_disabled'])
         self.assertEqual(call_args[1]['user'], "sandbox")
+        # 工作目录未与守护进程共享时不挂载，避免在守护进程主机上遗留目录
+        self.assertEqual(call_args[1]['host_config'], {
+            'mem_limit': "128m",
+            'cpu_quota': 50000,
+            'security_opt': ["no-new-privileges"],
+            'Binds': []
+        })
+        
+        # 验证代码已写入容器并启动
+        self.mock_container.put_archive.assert_called()
+        self.mock_container.start.assert_called_once()
         
         # 验证返回结果
-        self.assertTrue(result['success'])
-        self.assertEqual(result['exit_code'], 0)
-        self.assertEqual(result['output'], "Hello, World!\n")
-        self.assertEqual(result['container_id'], "abc123def456")
+        self.assertTrue(result.success)
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output, "Hello, World!\n")
+        self.assertEqual(result.container_id, "abc123def456")
+        self.assertEqual(result.generated_images, [])
         
         # 验证容器被清理
-        self.mock_container.remove.assert_called_once_with(force=True)
+        container_name = call_args[1]['name']
+        self.mock_docker_client.api.remove_container.assert_called_once_with(container_name, force=True)
+    
+    def test_code_file_owned_by_sandbox_user(self):
+        """测试代码文件以执行用户的uid/gid写入容器"""
+        SandboxService._put_code(self.mock_container, "print(1)")
+        
+        path, data = self.mock_container.put_archive.call_args[0]
+        self.assertEqual(path, "/tmp")
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            member = tar.getmember("sandbox_code.py")
+            self.assertEqual(member.uid, config.CONTAINER_UID)
+            self.assertEqual(member.gid, config.CONTAINER_UID)
+            self.assertEqual(tar.extractfile(member).read(), b"print(1)")
+    
+    def test_work_files_only_reown_data_dirs(self):
+        """测试引用文件只在/data之内解压，并只改写/data到工作目录之间各级目录的属主"""
+        uploaded = []
+        self.mock_container.put_archive.side_effect = lambda path, data: uploaded.append((path, data.read()))
+        
+        with tempfile.TemporaryDirectory() as host_work_dir:
+            with open(os.path.join(host_work_dir, "a.txt"), "w") as f:
+                f.write("hello")
+            
+            count = SandboxService._put_work_files(self.mock_container, host_work_dir, "/data/out")
+            
+            for work_dir in ["/tmp", "/", "/data/../usr"]:
+                with self.subTest(work_dir=work_dir):
+                    with self.assertRaises(ValueError):
+                        SandboxService._put_work_files(self.mock_container, host_work_dir, work_dir)
+        
+        self.mock_container.put_archive.side_effect = None
+        self.assertEqual(count, 1)
+        self.assertEqual(len(uploaded), 1)
+        path, data = uploaded[0]
+        self.assertEqual(path, "/")
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            members = tar.getmembers()
+        self.assertEqual([m.name for m in members], ["data", "data/out", "data/out/a.txt"])
+        for member in members:
+            self.assertEqual(member.uid, config.CONTAINER_UID)
+    
+    def test_timeout_kills_container(self):
+        """测试等待超时时终止容器并返回超时信息"""
+        wait_results = [requests.exceptions.ReadTimeout(), {'StatusCode': 137}]
+        with patch.object(self.mock_container, 'wait', side_effect=wait_results):
+            result = self.loop.run_until_complete(self._execute("while True: pass", timeout=1))
+        
+        self.mock_container.kill.assert_called_once()
+        self.assertFalse(result.success)
+        self.assertEqual(result.exit_code, 137)
+        self.assertEqual(result.error_message, "Execution timed out after 1s")
+    
+    def test_oversized_output_truncated(self):
+        """测试输出超过MAX_LOG_BYTES时截断并附加提示"""
+        stream = MagicMock()
+        stream.__iter__.return_value = iter([b"x" * 8, b"y" * 8, b"z" * 8])
+        with patch.object(config, 'MAX_LOG_BYTES', 10), patch.object(self.mock_container, 'logs', return_value=stream):
+            result = self.loop.run_until_complete(self._execute("print('x' * 100)"))
+        
+        self.assertEqual(result.output, "xxxxxxxxyy\n[output truncated at 10 bytes]")
+        stream.close.assert_called_once()
+    
+    def test_exec_output_capped_while_streaming(self):
+        """测试预热容器内执行时流式读取输出，超出上限的部分读出后丢弃"""
+        chunks = iter([b"x" * 8, b"y" * 8, b"z" * 8, b"w" * 8])
+        stream = MagicMock()
+        stream.__iter__.return_value = chunks
+        api = self.mock_container.client.api
+        api.exec_create.return_value = {'Id': "exec1"}
+        api.exec_start.return_value = stream
+        api.exec_inspect.return_value = {'ExitCode': 0}
+        
+        with patch.object(config, 'MAX_LOG_BYTES', 10):
+            exit_code, output = SandboxService._exec_capped(self.mock_container, ["python", "-c", "..."])
+        
+        self.assertEqual(exit_code, 0)
+        # 最多多保留一个分块用于判断是否截断，其余输出被读完丢弃
+        self.assertEqual(output, b"x" * 8 + b"y" * 8)
+        self.assertIsNone(next(chunks, None))
+        api.exec_start.assert_called_once_with("exec1", stream=True, demux=False)
+        api.exec_inspect.assert_called_once_with("exec1")
+        stream.close.assert_called_once()
+    
+    def test_pool_execution_releases_container(self):
+        """测试预热容器执行成功后重置放回池中，执行期间服务关闭池也能归还到原来的池"""
+        pool = MagicMock()
+        pool.try_acquire.return_value = self.mock_container
+        pool.release = AsyncMock()
+        
+        def exec_capped(container, command):
+            # 模拟执行期间服务关闭
+            self.service.container_pool = None
+            return 0, b"hi\n"
+        
+        self.service.container_pool = pool
+        with patch.object(SandboxService, '_exec_capped', side_effect=exec_capped) as exec_mock:
+            result = self.loop.run_until_complete(self._execute("print('hi')", timeout=5))
+        
+        self.assertTrue(result.success)
+        self.assertEqual(result.output, "hi\n")
+        self.assertIsNone(result.error_message)
+        command = exec_mock.call_args.args[1]
+        self.assertEqual(command[-len(_RUN_CODE_COMMAND) - 4:-len(_RUN_CODE_COMMAND)], ["timeout", "-k", "1", "5"])
+        pool.release.assert_awaited_once_with(self.mock_container, True)
+    
+    def test_pool_execution_timeout_discards_container(self):
+        """测试运行时间达到限制且被timeout终止时判定为超时，容器不再复用"""
+        result, pool = self._execute_in_pool(exit_code=124, elapsed=1.0, timeout=1)
+        
+        self.assertFalse(result.success)
+        self.assertEqual(result.error_message, "Execution timed out after 1s")
+        pool.release.assert_awaited_once_with(self.mock_container, False)
+    
+    def test_pool_execution_exit_124_before_timeout_not_timed_out(self):
+        """测试用户代码提前以124退出时不误判为超时"""
+        result, pool = self._execute_in_pool(exit_code=124, elapsed=0.1, timeout=5)
+        
+        self.assertFalse(result.success)
+        self.assertEqual(result.exit_code, 124)
+        self.assertIsNone(result.error_message)
+        pool.release.assert_awaited_once_with(self.mock_container, True)
+    
+    def _execute_in_pool(self, exit_code: int, elapsed: float, timeout: int):
+        """在模拟的池容器内执行，返回结果和模拟的池"""
+        pool = MagicMock()
+        pool.release = AsyncMock()
+        clock = MagicMock()
+        clock.monotonic.side_effect = [100.0, 100.0 + elapsed]
+        
+        async def run():
+            result = await self.service._execute_in_pool(
+                pool, self.mock_container, "pass", timeout, "/data", None
+            )
+            await self.service.shutdown()
+            return result
+        
+        with patch.object(SandboxService, '_exec_capped', return_value=(exit_code, b"")), \
+                patch('services.sandbox_service.time', clock):
+            return self.loop.run_until_complete(run()), pool
+    
+    async def _execute(self, code: str, timeout: int = None):
+        """执行代码，并等待后台清理任务完成后再返回结果"""
+        result = await self.service.execute_code(code, timeout=timeout)
+        await self.service.shutdown()
+        return result
+
+class TestContainerPool(unittest.TestCase):
+    """预热容器池单元测试类"""
+    
+    def setUp(self):
+        """每个测试使用新的容器池和事件循环"""
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        
+        self.docker_service = MagicMock()
+        self.replacement = MagicMock()
+        self.docker_service.get_client.return_value.containers.run.return_value = self.replacement
+        self.pool = ContainerPool(self.docker_service, 1)
+        self.container = MagicMock()
+    
+    def test_try_acquire(self):
+        """测试有空闲容器时取出，池空时返回None而不等待"""
+        self.pool._queue.put_nowait(self.container)
+        
+        self.assertIs(self.pool.try_acquire(), self.container)
+        self.assertIsNone(self.pool.try_acquire())
+    
+    def test_release_resets_and_requeues(self):
+        """测试重置成功的容器放回池中"""
+        self.container.exec_run.return_value = (0, b"")
+        self.loop.run_until_complete(self.pool.release(self.container))
+        
+        self.container.exec_run.assert_called_once_with(["sh", "-c", _RESET_SCRIPT])
+        self.container.remove.assert_not_called()
+        self.assertIs(self.pool.try_acquire(), self.container)
+    
+    def test_release_reset_failure_replaces_container(self):
+        """测试重置失败或出错的容器被销毁，并补充新容器"""
+        for reset in ({'return_value': (1, b"")}, {'side_effect': docker.errors.APIError("gone")}):
+            with self.subTest(reset=reset):
+                container = MagicMock()
+                container.exec_run.configure_mock(**reset)
+                self.loop.run_until_complete(self.pool.release(container))
+                
+                container.remove.assert_called_once_with(force=True)
+                self.assertIs(self.pool.try_acquire(), self.replacement)
+                self.assertIsNone(self.pool.try_acquire())
+    
+    def test_release_unhealthy_skips_reset(self):
+        """测试执行异常的容器不再重置，直接替换"""
+        self.loop.run_until_complete(self.pool.release(self.container, healthy=False))
+        
+        self.container.exec_run.assert_not_called()
+        self.container.remove.assert_called_once_with(force=True)
+        self.assertIs(self.pool.try_acquire(), self.replacement)
+
+class TestRefFileCache(unittest.TestCase):
+    """引用文件下载缓存单元测试类，使用本地HTTP服务模拟文件源"""
+    
+    @classmethod
+    def setUpClass(cls):
+        """本地文件服务和事件循环在所有测试间共享"""
+        cls.loop = asyncio.new_event_loop()
+        cls.addClassCleanup(cls.loop.close)
+        
+        cls.requests = []
+        cls.active = 0
+        cls.max_active = 0
+        
+        async def handle(request):
+            name = request.match_info['name']
+            cls.requests.append((name, request.headers.get('If-None-Match')))
+            if name.startswith('slow'):
+                # 记录同时在处理的下载请求数
+                cls.active += 1
+                cls.max_active = max(cls.max_active, cls.active)
+                await asyncio.sleep(0.05)
+                cls.active -= 1
+                return web.Response(body=name.encode())
+            if name.startswith('hang'):
+                # 一直挂起，直到测试结束时放行
+                await asyncio.wait_for(cls.unblock.wait(), 5)
+                return web.Response(body=b"late")
+            if name == 'missing':
+                return web.Response(status=404)
+            if name == 'no-validator':
+                return web.Response(body=b"plain")
+            if request.headers.get('If-None-Match') == '"v1"':
+                return web.Response(status=304)
+            return web.Response(body=b"hello" * 100, headers={'ETag': '"v1"'})
+        
+        app = web.Application()
+        app.router.add_get('/{name}', handle)
+        cls.runner = web.AppRunner(app)
+        cls.loop.run_until_complete(cls.runner.setup())
+        cls.loop.run_until_complete(web.TCPSite(cls.runner, '127.0.0.1', 0).start())
+        cls.addClassCleanup(lambda: cls.loop.run_until_complete(cls.runner.cleanup()))
+        cls.base_url = f"http://127.0.0.1:{cls.runner.addresses[0][1]}"
+    
+    def setUp(self):
+        self.requests.clear()
+        type(self).max_active = 0
+        type(self).unblock = asyncio.Event()
+        self.addCleanup(self.unblock.set)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = FileCache(os.path.join(self.tmp.name, "cache"))
+        self.file_service = FileService()
+        self.file_service._cache = self.cache
+    
+    def _download(self, name: str) -> bytes:
+        """下载一个引用文件到新的工作目录，返回文件内容"""
+        paths = self._download_all([name])
+        return Path(paths[0]).read_bytes()
+    
+    def _download_all(self, names: list) -> list:
+        """并发下载多个引用文件到新的工作目录，返回本地文件路径"""
+        work_dir = Path(tempfile.mkdtemp(dir=self.tmp.name))
+        ref_files = [RefFile(url=f"{self.base_url}/{name}") for name in names]
+        
+        async def run():
+            try:
+                return await self.file_service.download_ref_files(ref_files, work_dir)
+            finally:
+                await self.file_service.shutdown()
+        
+        return self.loop.run_until_complete(run())
+    
+    def test_download_writes_through_to_cache(self):
+        """测试200响应带ETag时写入缓存"""
+        content = self._download("data.txt")
+        
+        self.assertEqual(content, b"hello" * 100)
+        self.assertEqual(self.requests, [("data.txt", None)])
+        self.assertEqual(
+            self.cache.conditional_headers(f"{self.base_url}/data.txt"),
+            {"If-None-Match": '"v1"'}
+        )
+    
+    def test_not_modified_served_from_cache(self):
+        """测试304响应时使用缓存内容"""
+        self._download("data.txt")
+        content = self._download("data.txt")
+        
+        self.assertEqual(content, b"hello" * 100)
+        self.assertEqual(self.requests, [("data.txt", None), ("data.txt", '"v1"')])
+    
+    def test_response_without_validator_not_cached(self):
+        """测试响应没有ETag和Last-Modified时不缓存"""
+        self._download("no-validator")
+        content = self._download("no-validator")
+        
+        self.assertEqual(content, b"plain")
+        self.assertEqual(self.requests, [("no-validator", None), ("no-validator", None)])
+        self.assertEqual(os.listdir(self.cache.cache_dir), [])
+    
+    def test_cache_write_failure_does_not_fail_download(self):
+        """测试缓存写入失败时下载仍然成功"""
+        with patch.object(self.cache, 'store', side_effect=OSError(28, "No space left on device")):
+            content = self._download("data.txt")
+        
+        self.assertEqual(content, b"hello" * 100)
+    
+    def test_download_concurrency_limited(self):
+        """测试同时进行的下载数不超过DOWNLOAD_CONCURRENCY"""
+        names = [f"slow-{i}" for i in range(6)]
+        with patch.object(config, 'DOWNLOAD_CONCURRENCY', 2):
+            paths = self._download_all(names)
+        
+        self.assertEqual([Path(p).read_bytes() for p in paths], [n.encode() for n in names])
+        self.assertEqual(self.max_active, 2)
+    
+    def test_download_failure_cancels_siblings(self):
+        """测试任一文件下载失败时取消其余下载，并返回第一个错误"""
+        start = self.loop.time()
+        with self.assertRaises(HTTPException) as ctx:
+            self._download_all(["hang", "missing", "hang-2"])
+        
+        self.assertEqual(ctx.exception.status_code, 400)
+        self.assertIn("/missing", ctx.exception.detail)
+        # 挂起的下载被取消，而不是等到服务端超时
+        self.assertLess(self.loop.time() - start, 2)
+        self.assertIn("hang", [name for name, _ in self.requests])
+
+class TestRefFileValidation(unittest.TestCase):
+    """引用文件名与数量校验单元测试类，校验在发起任何下载前完成"""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.loop = asyncio.new_event_loop()
+        cls.addClassCleanup(cls.loop.close)
+        cls.file_service = FileService()
+    
+    def _assert_rejected(self, filenames, detail: str):
+        ref_files = [RefFile(url="http://127.0.0.1:9/file", filename=name) for name in filenames]
+        with tempfile.TemporaryDirectory() as work_dir:
+            with self.assertRaises(HTTPException) as ctx:
+                self.loop.run_until_complete(
+                    self.file_service.download_ref_files(ref_files, Path(work_dir))
+                )
+        self.assertEqual(ctx.exception.status_code, 400)
+        self.assertIn(detail, ctx.exception.detail)
+        # 校验失败时不应创建HTTP会话
+        self.assertIsNone(self.file_service._session)
+    
+    def test_path_traversal_rejected(self):
+        """测试包含..、绝对路径或反斜杠的文件名被拒绝"""
+        for name in ["../escape.txt", "a/../../escape.txt", "/etc/passwd", "dir\\file.txt", "."]:
+            with self.subTest(filename=name):
+                self._assert_rejected([name], "Invalid ref file name")
+    
+    def test_duplicate_names_rejected(self):
+        """测试规范化后同名的文件被拒绝"""
+        self._assert_rejected(["data.csv", "./data.csv"], "Duplicate ref file names")
+    
+    def test_ref_file_count_limit(self):
+        """测试引用文件数量上限"""
+        ref_files = [{"url": f"http://example.com/{i}"} for i in range(MAX_REF_FILES + 1)]
+        
+        ExecuteRequest(code="print(1)", ref_files=ref_files[:MAX_REF_FILES])
+        with self.assertRaises(ValidationError):
+            ExecuteRequest(code="print(1)", ref_files=ref_files)
 
-# 为异步测试方法添加同步包装器
-for method_name in dir(TestSandboxExecutor):
-    if method_name.startswith('test_') and asyncio.iscoroutinefunction(getattr(TestSandboxExecutor, method_name)):
-        original_method = getattr(TestSandboxExecutor, method_name)
-        
-        def create_sync_wrapper(async_method):
-            def sync_wrapper(self):
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    return loop.run_until_complete(async_method(self))
-                finally:
-                    loop.close()
-            return sync_wrapper
-        
-        setattr(TestSandboxExecutor, method_name, create_sync_wrapper(original_method))
+class TestValidators(unittest.TestCase):
+    """请求参数校验单元测试类"""
+    
+    def test_work_dir_under_data(self):
+        """测试/data及其子目录被接受并规范化"""
+        self.assertEqual(validate_work_dir(None), "/data")
+        self.assertEqual(validate_work_dir("/data"), "/data")
+        self.assertEqual(validate_work_dir("/data/"), "/data")
+        self.assertEqual(validate_work_dir("/data/out/./img"), "/data/out/img")
+    
+    def test_work_dir_outside_data_rejected(self):
+        """测试/data之外的工作目录被拒绝"""
+        for work_dir in ["/", "/tmp", "/usr/local/bin", "/database", "/data/../etc", "data", "//data"]:
+            with self.subTest(work_dir=work_dir):
+                with self.assertRaises(HTTPException) as ctx:
+                    validate_work_dir(work_dir)
+                self.assertEqual(ctx.exception.status_code, 400)
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()